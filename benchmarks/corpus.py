@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# Generates synthetic .eml corpora for the benchmarks.
+# Usage: python3 -m benchmarks.corpus OUT_DIR [--profile NAME] [--count N]
+
+import argparse
+import base64
+import os
+import os.path
+import random
+
+from email.message import EmailMessage
+
+from eml_vcard_export.vcard.lexer import vcard_fold_line
+
+FIRST_NAMES = ( 'Anna', 'Ben', 'Chloé', 'David', 'Emma', 'Felix', 'Greta', 'Hugo', 'Ida', 'Jörg' )
+LAST_NAMES = ( 'Meier', 'Schmidt', 'Dubois', 'Rossi', 'Novák', 'Smith', 'García', 'Olsen' )
+ORGS = ( 'Example Inc.', 'ACME\\; Widgets', 'Muster GmbH', 'Initech' )
+CITIES = ( 'Zürich', 'Berlin', 'Lyon', 'Springfield', 'Oslo' )
+
+class CorpusProfile( object ):
+    # describes the cards of a corpus
+
+    def __init__(self, name, emails=(1, 2), tels=(1, 2), adrs=(0, 1), photo_size=0, 
+                 photo_cid=False, note_size=0, line_length=75):
+        self.name = name
+        # (min, max) count of repeated attributes
+        self.emails = emails
+        self.tels = tels
+        self.adrs = adrs
+        # size of the PHOTO in bytes, 0 for no photo
+        self.photo_size = photo_size
+        # attach the PHOTO as MIME part referenced with a cid: URI instead of inline
+        self.photo_cid = photo_cid
+        self.note_size = note_size
+        self.line_length = line_length
+
+PROFILES = {
+    'small': CorpusProfile( 'small' ),
+    'photo-inline': CorpusProfile( 'photo-inline', photo_size=200000 ),
+    'photo-cid': CorpusProfile( 'photo-cid', photo_size=200000, photo_cid=True ),
+    'folded': CorpusProfile( 'folded', note_size=4000, line_length=20 ),
+    'repeated': CorpusProfile( 'repeated', emails=(20, 40), tels=(10, 20), adrs=(5, 10) ),
+}
+
+class CorpusGenerator( object ):
+
+    def __init__(self, profile, seed=0):
+        self.profile = profile
+        self.rnd = random.Random( seed )
+
+    def _repeat(self, count_range):
+        return range( self.rnd.randint( *count_range ) )
+
+    def mk_card_lines(self, num, photo_uri=None, photo_data=None):
+        rnd = self.rnd
+        given = rnd.choice( FIRST_NAMES )
+        family = rnd.choice( LAST_NAMES )
+        lines = [
+            "BEGIN:VCARD",
+            "VERSION:3.0",
+            "FN:{} {}".format( given, family ),
+            "N:{};{};;;".format( family, given ),
+            "ORG:{};Dept {}".format( rnd.choice(ORGS), num % 7 ),
+            "UID:urn:uuid:{:08x}-0000-4000-8000-{:012x}".format( num, rnd.getrandbits(48) ),
+        ]
+        for i in self._repeat( self.profile.emails ):
+            lines.append( "item{}.EMAIL;TYPE=INTERNET:{}.{}{}@example.com".format( i+1, given.lower(), family.lower(), i ) )
+        for i in self._repeat( self.profile.tels ):
+            lines.append( "TEL;TYPE=\"cell,voice\":+41 44 {:03d} {:02d} {:02d}".format( num % 1000, i, rnd.randint(0, 99) ) )
+        for i in self._repeat( self.profile.adrs ):
+            lines.append( "ADR;TYPE=work:;;{} Main St;{};;{:05d};".format( i+1, rnd.choice(CITIES), rnd.randint(1000, 99999) ) )
+        if self.profile.note_size:
+            words = [ rnd.choice( ('lorem', 'ipsum', 'dolor', 'sit', 'amet\\,', 'über') ) for i in range( self.profile.note_size // 6 ) ]
+            lines.append( "NOTE:" + " ".join( words ) )
+        if photo_uri is not None:
+            lines.append( "PHOTO;VALUE=uri:" + photo_uri )
+        elif photo_data is not None:
+            lines.append( "PHOTO;ENCODING=b;TYPE=JPEG:" + base64.b64encode( photo_data ).decode( "ascii" ) )
+        lines.append( "X-CUSTOM-FIELD;X-PARAM=value:custom {}".format( num ) )
+        lines.append( "END:VCARD" )
+        return lines
+
+    def mk_message(self, num):
+        profile = self.profile
+        photo_data = None
+        photo_uri = None
+        cid = None
+        if profile.photo_size:
+            photo_data = self.rnd.randbytes( profile.photo_size )
+            if profile.photo_cid:
+                cid = "photo{}@corpus.example".format( num )
+                photo_uri = "cid:" + cid
+
+        lines = self.mk_card_lines( num, photo_uri=photo_uri, photo_data=None if cid else photo_data )
+        card = "\r\n".join( vcard_fold_line( l, line_length=profile.line_length ).replace( "\n", "\r\n" ) for l in lines ) + "\r\n"
+
+        m = EmailMessage()
+        m[ 'From' ] = "sender{}@example.com".format( num )
+        m[ 'To' ] = "archive@example.com"
+        m[ 'Subject' ] = "Contact {}".format( num )
+        m.set_content( card, subtype='directory', params={ 'profile': 'vCard' } )
+        if cid is not None:
+            m.add_related( photo_data, maintype='image', subtype='jpeg', cid="<{}>".format( cid ) )
+        return bytes( m )
+
+    def write(self, out_dir, count, files_per_dir=None):
+        # files_per_dir: spread the files over numbered sub directories
+        paths = []
+        for num in range( count ):
+            sub_dir = out_dir
+            if files_per_dir:
+                sub_dir = os.path.join( out_dir, "{:04d}".format( num // files_per_dir ) )
+            os.makedirs( sub_dir, exist_ok=True )
+            path = os.path.join( sub_dir, "{:07d}.eml".format( num ) )
+            with open( path, 'wb' ) as fp:
+                fp.write( self.mk_message( num ) )
+            paths.append( path )
+        return paths
+
+def main():
+    arg_p = argparse.ArgumentParser( description="synthetic .eml corpus generator" )
+    arg_p.add_argument( 'out_dir', metavar='OUT_DIR' )
+    arg_p.add_argument( '--profile', choices=sorted(PROFILES), default='small' )
+    arg_p.add_argument( '--count', type=int, default=1000 )
+    arg_p.add_argument( '--photo-size', type=int, default=None, help="Override the PHOTO size in bytes" )
+    arg_p.add_argument( '--seed', type=int, default=0 )
+    arg_p.add_argument( '--files-per-dir', type=int, default=None )
+    args = arg_p.parse_args()
+
+    profile = PROFILES[ args.profile ]
+    if args.photo_size is not None:
+        profile.photo_size = args.photo_size
+    CorpusGenerator( profile, seed=args.seed ).write( args.out_dir, args.count, files_per_dir=args.files_per_dir )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Measures CsvTable.append_row scaling with the number of rows.
+# Usage: python3 -m benchmarks.csv_table [--max-rows N]
+
+import argparse
+import random
+import time
+
+from eml_vcard_export.csv_export import CsvTable
+
+def mk_row( rnd, num ):
+    # resembles the output of FullCsvExportStrategy.vcard_to_row: a few
+    # common columns and a varying number of repeated attribute columns
+    row = {
+        'FILE_PATH': '/archive/{}.eml'.format( num ),
+        'VERSION_1_VALUE': '3.0',
+        'FN_1_VALUE': 'Contact {}'.format( num ),
+    }
+    for i in range( 1, rnd.randint( 1, 6 )+1 ):
+        row[ 'EMAIL_{}_VALUE'.format(i) ] = 'contact{}.{}@example.com'.format( num, i )
+        row[ 'EMAIL_{}_PARAM'.format(i) ] = 'TYPE=INTERNET'
+    for i in range( 1, rnd.randint( 0, 3 )+1 ):
+        row[ 'ADR_{}_STREET_1'.format(i) ] = '{} Main St'.format( num )
+        row[ 'ADR_{}_CITY_1'.format(i) ] = 'Town'
+    return row
+
+def run( row_count, seed=0 ):
+    rnd = random.Random( seed )
+    rows = [ mk_row( rnd, n ) for n in range( row_count ) ]
+
+    start = time.perf_counter()
+    table = CsvTable()
+    for row in rows:
+        table.append_row( row )
+    table.drop_na_columns()
+    df = table.df
+    elapsed = time.perf_counter() - start
+    return elapsed, df.shape
+
+def main():
+    arg_p = argparse.ArgumentParser( description="CsvTable append scaling benchmark" )
+    arg_p.add_argument( '--max-rows', type=int, default=128000 )
+    args = arg_p.parse_args()
+
+    row_count = 1000
+    print( "{:>10} {:>10} {:>14} {:>8}".format( "rows", "columns", "us/row", "seconds" ) )
+    while row_count <= args.max_rows:
+        elapsed, shape = run( row_count )
+        print( "{:>10} {:>10} {:>14.2f} {:>8.3f}".format( shape[0], shape[1], elapsed/row_count*1e6, elapsed ) )
+        row_count *= 2
+
+if __name__ == "__main__":
+    main()
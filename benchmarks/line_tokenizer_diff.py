@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# Differential check of vCardLineTokenizer (bulk unfolding with regular
+# expressions) against ReferenceLineTokenizer, the previous character by
+# character state machine kept here as reference.
+# Usage: python3 -m benchmarks.line_tokenizer_diff [PATH ...] [--random N]
+# PATH are eml files or directories, checked in addition to the synthetic corpus
+# profiles, the edge cases and N random inputs. Exits with 1 on a mismatch.
+#
+# Intended difference: the reference stops at a line break at the start of the
+# data, vCardLineTokenizer skips it. Leading line breaks are stripped before the
+# data is given to the reference, and the line numbers are shifted accordingly.
+
+import argparse
+import random
+import re
+import sys
+
+from eml_vcard_export.helper import FileIterator
+from eml_vcard_export.directory_message import DirectoryMessage
+from eml_vcard_export.vcard.lexer import vCardLineTokenizer, vcard_fold_line
+
+from .corpus import PROFILES, CorpusGenerator
+
+_LINE_BREAK_RE = re.compile( '\r\n|\r|\n' )
+
+class ReferenceLineTokenizer( object ):
+    # vCardLineTokenizer before the bulk unfolding
+    def __init__(self, data=''):
+        self.load( data )
+
+    def load(self, data):
+        self.index = 0
+        self.max_index = len(data)
+        self.data = data
+        self.line_number = 0
+        self.line = ""
+
+    def next(self):
+        state = ''
+        idx = self.index
+        line_buff = ''
+        while True:
+            if idx == self.max_index:
+                break
+            c = self.data[ idx ]
+
+            # state machine transition
+            if c in ('\r', '\n'):
+                # accepting \r\n, \r, \n as line end (RFC accepts only \r\n)
+                state = 'CR_LF'
+            elif state == 'CR_LF':
+                if c in ('\t', ' '):
+                    state = 'CR_LF_SP'
+                else:
+                    state = 'CR_LF_NSP'
+            else:
+                state = ''
+
+            if state == 'CR_LF_NSP':
+                # normal line without folding or end of folded line
+                break
+            elif c != '\r' and c != '\n' and state != 'CR_LF_SP':
+                # filter CR, LF and CR_LF_SP
+                line_buff += c
+
+            idx += 1
+
+        self.index = idx
+        self.line = line_buff
+        return self.line
+
+EDGE_CASES = (
+    "",
+    "\r\n",
+    "\n\n\n",
+    "\r\nBEGIN:VCARD\r\nEND:VCARD\r\n",
+    "\n\r\nFN:leading blank lines\n",
+    "FN:no final line break",
+    "FN:mixed\rN:line\nNOTE:breaks\r\nEND:VCARD",
+    "FN:empty\r\n\r\n\r\nlines\r\n",
+    "NOTE:folded\r\n  with space\r\n\twith tab\r\n",
+    "NOTE:fold at the end\r\n ",
+    "NOTE:empty continuation\r\n \r\n \r\nEND:VCARD\r\n",
+    "ORG:ACME\\; Widgets;Dept\\, Sales\r\n",
+    "NOTE:escaped\\nnew line\\\\ and back\\\r\n slash\r\n",
+    "TEL;TYPE=\"cell,voice\":+1 555 0100\r\n",
+    "X-A;X-P=\"quoted;:,value\";Y=\"\":v\r\n",
+    "item1.EMAIL;TYPE=INTERNET,\r\n pref:j@exa\r\n mple.com\r\n",
+    "FN:Jörg Müller\r\n Über\r\n",
+)
+
+def mk_card_text( profile, num ):
+    gen = CorpusGenerator( profile, seed=num )
+    photo_data = gen.rnd.randbytes( profile.photo_size ) if profile.photo_size else None
+    lines = gen.mk_card_lines( num, photo_data=photo_data )
+    return "\r\n".join( vcard_fold_line( l, line_length=profile.line_length ).replace( "\n", "\r\n" ) for l in lines ) + "\r\n"
+
+def iter_corpus( count ):
+    for name, profile in sorted( PROFILES.items() ):
+        for num in range( 2 if profile.photo_size else count ):
+            yield "{} {}".format( name, num ), mk_card_text( profile, num )
+
+def iter_random( count, seed=0 ):
+    rnd = random.Random( seed )
+    alphabet = ( 'a', 'B', ':', ';', '\\', '"', ' ', '\t', '\r', '\n', '\r\n', 'ü' )
+    for num in range( count ):
+        yield "random {}".format( num ), "".join( rnd.choice( alphabet ) for i in range( rnd.randint( 0, 40 ) ) )
+
+def iter_files( paths ):
+    for file_path in FileIterator( *paths, extensions=('eml',) ):
+        try:
+            with DirectoryMessage.from_file( file_path ) as dm:
+                vcard_data = dm.extract_vcard()
+            yield file_path, vcard_data
+        except Exception as e:
+            print( "Ignoring file:", file_path, e, file=sys.stderr )
+
+def reference_lines( data ):
+    # (logical line, first physical line) of the reference tokenizer
+    stripped = data.lstrip( '\r\n' )
+    skipped_lines = len( _LINE_BREAK_RE.findall( data[ :len(data)-len(stripped) ] ) )
+    t = ReferenceLineTokenizer( stripped )
+    lines = []
+    while True:
+        start = t.index
+        line = t.next()
+        if line == '':
+            break
+        lines.append( ( line, skipped_lines + len( _LINE_BREAK_RE.findall( stripped[ :start ] ) ) + 1 ) )
+    return lines
+
+def tokenizer_lines( data ):
+    t = vCardLineTokenizer( data )
+    lines = []
+    while True:
+        line = t.next()
+        if line == '':
+            break
+        lines.append( ( line, t.line_range[0] ) )
+    return lines
+
+def check( name, data ):
+    expected = reference_lines( data )
+    actual = tokenizer_lines( data )
+    if expected == actual:
+        return True
+    print( "mismatch:", name, file=sys.stderr )
+    print( "  data:     ", repr( data[:200] ), file=sys.stderr )
+    print( "  reference:", repr( expected[:5] ), file=sys.stderr )
+    print( "  tokenizer:", repr( actual[:5] ), file=sys.stderr )
+    return False
+
+def main():
+    arg_p = argparse.ArgumentParser( description="vCardLineTokenizer differential check" )
+    arg_p.add_argument( 'paths', metavar='PATH', nargs='*' )
+    arg_p.add_argument( '--random', metavar='N', type=int, default=20000,
+                        help="Number of random inputs. Defaults to 20000." )
+    arg_p.add_argument( '--count', metavar='N', type=int, default=50,
+                        help="Cards per corpus profile. Defaults to 50." )
+    args = arg_p.parse_args()
+
+    cases = [ ( "edge {}".format(i), data ) for i, data in enumerate( EDGE_CASES ) ]
+    inputs = ( cases, iter_corpus( args.count ), iter_random( args.random ), iter_files( args.paths ) )
+    count = 0
+    failed = 0
+    for cases in inputs:
+        for name, data in cases:
+            count += 1
+            if not check( name, data ):
+                failed += 1
+
+    print( "inputs:           {}".format( count ) )
+    print( "mismatches:       {}".format( failed ) )
+    if failed:
+        sys.exit( 1 )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Measures the memory held by parsed vCard objects, reported per 100k cards.
+# Usage: python3 -m benchmarks.memory [--profile NAME] [--count N] [--decode]
+# --decode also reads the decoded attributes (text, components, ...), like the
+# exporters do; otherwise only the raw values parsed from the content lines are kept.
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from eml_vcard_export.vcard.parser import parse_vcard
+
+from .corpus import PROFILES, CorpusGenerator
+
+def mk_card_texts( profile, count, seed=0 ):
+    gen = CorpusGenerator( profile, seed=seed )
+    return [ "\r\n".join( gen.mk_card_lines( num ) ) + "\r\n" for num in range( count ) ]
+
+def decode_all( cards ):
+    for card in cards:
+        for attr in card.attrs:
+            for name in attr._decoded_attr_names:
+                getattr( attr, name )
+
+def measure( texts, decode=False ):
+    # returns the bytes allocated by the cards still alive, and the parse time
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    cards = [ parse_vcard( text ) for text in texts ]
+    if decode:
+        decode_all( cards )
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, len(cards)
+
+def main():
+    arg_p = argparse.ArgumentParser( description="vCard object model memory benchmark" )
+    arg_p.add_argument( '--profile', choices=sorted(PROFILES), default='small' )
+    arg_p.add_argument( '--count', metavar='N', type=int, default=100000,
+                        help="Number of cards to keep in memory. Defaults to 100000." )
+    arg_p.add_argument( '--decode', default=False, action='store_true',
+                        help="Also decode the attribute values." )
+    args = arg_p.parse_args()
+
+    if args.count <= 0:
+        print( "count must be positive", file=sys.stderr )
+        sys.exit( 1 )
+
+    texts = mk_card_texts( PROFILES[ args.profile ], args.count )
+    size, elapsed, count = measure( texts, decode=args.decode )
+    print( "cards:            {}".format( count ) )
+    print( "bytes/card:       {:.0f}".format( size / count ) )
+    print( "MiB/100k cards:   {:.1f}".format( size / count * 100000 / (1<<20) ) )
+    print( "parse time:       {:.2f} us/card".format( elapsed / count * 1e6 ) )
+
+if __name__ == "__main__":
+    main()
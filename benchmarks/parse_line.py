@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Measures the per content line cost of vCardParser._parse_line (single regex
+# fast path) against vCardParser._parse_line_tokenized (incremental tokenizer).
+# Usage: python3 -m benchmarks.parse_line [PATH ...]
+# PATH are eml files or directories, without PATH a built-in card is used.
+
+import argparse
+import sys
+import time
+
+from eml_vcard_export.helper import FileIterator
+from eml_vcard_export.directory_message import DirectoryMessage
+from eml_vcard_export.vcard.lexer import vCardLineTokenizer
+from eml_vcard_export.vcard.parser import vCardParser
+
+SAMPLE_CARD = (
+    "BEGIN:VCARD\r\n"
+    "VERSION:3.0\r\n"
+    "FN:Jane Doe\r\n"
+    "N:Doe;Jane;;Dr.;\r\n"
+    "ORG:Example Inc.;Research\r\n"
+    "item1.EMAIL;TYPE=INTERNET,pref:jane@example.com\r\n"
+    "TEL;TYPE=\"cell,voice\":+1 555 0100\r\n"
+    "ADR;TYPE=work:;;1 Main St;Springfield;ST;12345;USA\r\n"
+    "NOTE:Met at the conference\\, follow up in spring\r\n"
+    "X-CUSTOM;X-PARAM=value:something\r\n"
+    "END:VCARD\r\n"
+)
+
+def load_lines( paths ):
+    lines = []
+    if not paths:
+        return list( vCardLineTokenizer( SAMPLE_CARD ) )
+
+    for file_path in FileIterator( *paths, extensions=('eml',) ):
+        try:
+            with DirectoryMessage.from_file( file_path ) as dm:
+                lines.extend( vCardLineTokenizer( dm.extract_vcard() ) )
+        except Exception as e:
+            print( "Ignoring file:", file_path, e, file=sys.stderr )
+    return lines
+
+def time_per_line( parse_func, lines, min_time=1.0 ):
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for line in lines:
+            parse_func( line )
+        count += len( lines )
+        elapsed = time.perf_counter() - start
+    return elapsed / count
+
+def main():
+    arg_p = argparse.ArgumentParser( description="content line parser benchmark" )
+    arg_p.add_argument( 'paths', metavar='PATH', nargs='*' )
+    args = arg_p.parse_args()
+
+    lines = load_lines( args.paths )
+    if not lines:
+        print( "no content lines found", file=sys.stderr )
+        sys.exit( 1 )
+
+    p = vCardParser()
+    tokenized = time_per_line( p._parse_line_tokenized, lines )
+    fast = time_per_line( p._parse_line, lines )
+    print( "lines:            {}".format( len(lines) ) )
+    print( "tokenized:        {:.2f} us/line".format( tokenized*1e6 ) )
+    print( "single regex:     {:.2f} us/line".format( fast*1e6 ) )
+    print( "speedup:          {:.2f}x".format( tokenized/fast ) )
+
+if __name__ == "__main__":
+    main()
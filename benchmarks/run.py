@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Times each processing stage on generated corpora and saves the results as JSON.
+# Usage: python3 -m benchmarks.run [--profile NAME ...] [--count N] [-o RESULTS.json] [--compare OLD.json]
+
+import argparse
+import datetime
+import json
+import os
+import os.path
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from eml_vcard_export.directory_message import DirectoryMessage
+from eml_vcard_export.vcard.lexer import vCardLineTokenizer
+from eml_vcard_export.vcard.parser import vCardParser
+from eml_vcard_export import csv_export
+from eml_vcard_export import json_export
+from eml_vcard_export import vcf_export
+
+from .corpus import PROFILES, CorpusGenerator
+
+REPO_DIR = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+CLI_SCRIPT = os.path.join( REPO_DIR, 'eml-vcard-export.py' )
+
+def timed( func, items ):
+    start = time.perf_counter()
+    for item in items:
+        func( item )
+    return time.perf_counter() - start
+
+def parse_all( texts ):
+    # fresh cards for every stage, attribute values are decoded and cached on first use
+    return [ vCardParser().parse_vcard( text ) for text in texts ]
+
+def extract_vcard( path, fast_mime=False ):
+    with DirectoryMessage.from_file( path, fast_mime=fast_mime ) as dm:
+        return dm.extract_vcard()
+
+def bench_stages( paths ):
+    stages = {}
+    stages[ 'load_message' ] = timed( extract_vcard, paths )
+    stages[ 'load_message_fast' ] = timed( lambda p: extract_vcard( p, fast_mime=True ), paths )
+
+    texts = [ extract_vcard( p ) for p in paths ]
+    stages[ 'line_tokenizer' ] = timed( lambda t: list( vCardLineTokenizer( t ) ), texts )
+    stages[ 'parser' ] = timed( lambda t: vCardParser().parse_vcard( t ), texts )
+
+    strategy = csv_export.FullCsvExportStrategy()
+    stages[ 'csv_strategy' ] = timed( strategy.vcard_to_row, parse_all( texts ) )
+
+    strategy = json_export.DefaultJsonExportStrategy()
+    stages[ 'json_strategy' ] = timed( lambda c: json.dumps( strategy.vcard_to_native( c ) ), parse_all( texts ) )
+
+    strategy = vcf_export.DefaultVcfExportStrategy()
+    stages[ 'vcf_strategy' ] = timed( strategy.serialize_vcard, parse_all( texts ) )
+    return stages
+
+def bench_cli( corpus_dir, out_dir ):
+    stages = {}
+    for subcommand in ( 'csv_export', 'json_export', 'vcf_export' ):
+        out_path = os.path.join( out_dir, subcommand + '.out' )
+        cmd = [ sys.executable, CLI_SCRIPT, subcommand, corpus_dir, '-o', out_path ]
+        start = time.perf_counter()
+        subprocess.run( cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL )
+        stages[ 'cli_' + subcommand ] = time.perf_counter() - start
+    return stages
+
+def git_commit():
+    try:
+        out = subprocess.run( [ 'git', 'rev-parse', 'HEAD' ], cwd=REPO_DIR, capture_output=True, text=True, check=True )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run( profile_names, count, with_cli=True, seed=0 ):
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.now( datetime.timezone.utc ).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'corpora': {},
+    }
+    for name in profile_names:
+        with tempfile.TemporaryDirectory( prefix='eml-bench-' ) as tmp_dir:
+            corpus_dir = os.path.join( tmp_dir, 'corpus' )
+            paths = CorpusGenerator( PROFILES[ name ], seed=seed ).write( corpus_dir, count )
+            print( "profile {}: {} files".format( name, len(paths) ), file=sys.stderr )
+
+            stages = bench_stages( paths )
+            if with_cli:
+                stages.update( bench_cli( corpus_dir, tmp_dir ) )
+
+            results[ 'corpora' ][ name ] = {
+                'count': len( paths ),
+                'bytes': sum( os.path.getsize(p) for p in paths ),
+                'stages': { stage: { 'seconds': sec, 'us_per_card': sec / len(paths) * 1e6 } 
+                            for stage, sec in stages.items() },
+            }
+    return results
+
+def print_results( results, old_results=None ):
+    for name, corpus in results[ 'corpora' ].items():
+        print( "== {} ({} cards, {} bytes)".format( name, corpus['count'], corpus['bytes'] ) )
+        old_stages = {}
+        if old_results is not None:
+            old_stages = old_results[ 'corpora' ].get( name, {} ).get( 'stages', {} )
+        for stage, data in corpus[ 'stages' ].items():
+            line = "  {:<20} {:>12.1f} us/card".format( stage, data['us_per_card'] )
+            if stage in old_stages:
+                old = old_stages[ stage ][ 'us_per_card' ]
+                line += "  old {:>12.1f}  x{:.2f}".format( old, old / data['us_per_card'] )
+            print( line )
+
+def main():
+    arg_p = argparse.ArgumentParser( description="eml-vcard-export stage benchmarks" )
+    arg_p.add_argument( '--profile', dest='profiles', action='append', choices=sorted(PROFILES),
+                        help="Corpus profile to run, may be repeated. Defaults to all." )
+    arg_p.add_argument( '--count', type=int, default=200, help="Cards per corpus" )
+    arg_p.add_argument( '--no-cli', dest='with_cli', default=True, action='store_false',
+                        help="Skip the full CLI runs" )
+    arg_p.add_argument( '--out-file', '-o', metavar='RESULTS.json', dest='output_path', default=None )
+    arg_p.add_argument( '--compare', metavar='OLD.json', default=None,
+                        help="Results of a previous run to compare with" )
+    args = arg_p.parse_args()
+
+    profiles = args.profiles or sorted( PROFILES )
+    results = run( profiles, args.count, with_cli=args.with_cli )
+
+    old_results = None
+    if args.compare is not None:
+        with open( args.compare ) as fp:
+            old_results = json.load( fp )
+    print_results( results, old_results )
+
+    if args.output_path is not None:
+        with open( args.output_path, 'w' ) as fp:
+            json.dump( results, fp, indent=2 )
+
+if __name__ == "__main__":
+    main()
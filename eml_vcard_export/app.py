@@ -1,135 +1,515 @@
 import argparse
+import itertools
 import os
 import os.path
 import sys
-import traceback
 import json
 
-import pandas as pd
-
 from .helper import FileIterator, FileOutput
 from .directory_message import DirectoryMessage
+from .executor import ParallelExecutor, TaskResult
+from .blob_store import BlobStore
+from .sources import MboxReader, MaildirReader, MBOX_VARIANTS, source_fields
+from .prefetch import Prefetcher, PrefetchedRef
+from .where import WhereExpression, WhereSyntaxError
+from .dedupe import Deduper, dedupe_keys, KEY_TYPES, DEFAULT_KEY_TYPES
+from .incremental import IncrementalState, IncrementalTask, IncrementalResult, file_digest, data_digest
 from . import vcard
 from . import csv_export
 from . import vcf_export
 from . import json_export
+from . import parquet_export
+from . import sqlite_export
+
+class ExportApp( object ):
+
+    def __init__(self):
+        self.strategy = None
+        self.fast_mime = False
+        self.dedupe_key_types = DEFAULT_KEY_TYPES
+        self.where = None
 
-class ExportCsvApp( object ):
-    
     def parse_args(self, export_p):
-        export_p.add_argument('input_path', metavar="PATH", 
-                              help="Path to a input eml file or a directory to search for eml files" )
+        export_p.add_argument('input_path', metavar="PATH", nargs='*',
+                              help="Paths to input eml files or directories to search for eml files" )
+        export_p.add_argument('--files-from', metavar='FILE', dest='files_from', action='append', default=[],
+                              help="Read NUL separated eml file paths from FILE, - for stdin. "
+                                   "Use with find -print0. Can be given multiple times." )
+        export_p.add_argument('--input-format', dest='input_format', choices=('eml','mbox','maildir'), default='eml',
+                              help="eml: PATH is an eml file, a zip or tar archive or a directory of those. mbox: PATH is a mbox file "
+                                   "or a directory of mbox files. maildir: PATH is a Maildir. Defaults to eml." )
+        export_p.add_argument('--mbox-variant', dest='mbox_variant', choices=MBOX_VARIANTS, default='mboxo',
+                              help="mboxrd: the writer quoted \">From \" lines as \">>From \", unquote them. "
+                                   "mboxo: leave the body as it is, also for mboxcl. Defaults to mboxo." )
         export_p.add_argument('--limit', metavar='COUNT', dest='limit_infiles', type=int, default=-1,
-                              help="Limit processing to the first COUNT found files. Defaults to -1, unlimited." )
-        export_p.add_argument('--out-file','-o', metavar='FILE.CSV', dest='output_path', default=None,
+                              help="Limit processing to the first COUNT found messages. Defaults to -1, unlimited." )
+        export_p.add_argument('--out-file','-o', metavar='FILE', dest='output_path', default=None,
                               help="Path to the output file. If omitted, stdout is used." )
-        
+        export_p.add_argument('--jobs','-j', metavar='N', dest='jobs', type=int, default=1,
+                              help="Number of worker processes. 0 uses all CPUs. Defaults to 1, no worker processes." )
+        export_p.add_argument('--incremental', metavar='STATE_FILE', dest='incremental_state', default=None,
+                              help="Keep the records of processed files in STATE_FILE and only process new or changed files. "
+                                   "An interrupted run resumes where it stopped." )
+        export_p.add_argument('--prefetch', metavar='N', dest='prefetch', type=int, default=0,
+                              help="Read up to N messages ahead in background threads, for file systems with high latency. "
+                                   "Defaults to 0, no read ahead." )
+        export_p.add_argument('--fast-mime', dest='fast_mime', default=False, action='store_true',
+                              help="Scan the raw message for the vcard part instead of parsing the whole email. "
+                                   "Falls back to the full parser for unusual message structures." )
+        export_p.add_argument('--where', metavar='EXPR', dest='where', type=self._where_expression, default=None,
+                              help="Only export the cards matching EXPR, e.g. \"email $= '@example.com' and not tel[type] = fax\". "
+                                   "Terms are NAME, NAME[PARAM] and NAME OP VALUE with OP one of = != ~ ^= $=, "
+                                   "combined with and, or, not and parentheses. Names and values are case insensitive." )
+        export_p.add_argument('--dedupe', dest='dedupe', default=False, action='store_true',
+                              help="Merge the cards of the same contact, matched by the keys of --dedupe-keys, "
+                                   "and output one card per contact." )
+        export_p.add_argument('--dedupe-keys', metavar='KEYS', dest='dedupe_keys', type=self._key_types,
+                              default=list(DEFAULT_KEY_TYPES),
+                              help="Comma separated attributes which identify a contact, of {}. "
+                                   "Defaults to {}.".format( ",".join(KEY_TYPES), ",".join(DEFAULT_KEY_TYPES) ) )
+        export_p.add_argument('--spill-dir', metavar='DIR', dest='spill_dir', default=None,
+                              help="Directory for the temporary files of --dedupe. Defaults to the system temp directory." )
+        export_p.add_argument('--blob-dir', metavar='DIR', dest='blob_dir', default=None,
+                              help="Write binary PHOTO, LOGO and SOUND payloads once to DIR, named by their hash, "
+                                   "and reference them by a URI relative to the output file." )
+
+    @staticmethod
+    def _key_types( value ):
+        key_types = [ k.strip().lower() for k in value.split(',') if k.strip() ]
+        for key_type in key_types:
+            if key_type not in KEY_TYPES:
+                raise argparse.ArgumentTypeError( "unknown key {}".format( key_type ) )
+        return key_types
+
+    @staticmethod
+    def _where_expression( value ):
+        try:
+            return WhereExpression( value )
+        except WhereSyntaxError as e:
+            raise argparse.ArgumentTypeError( str(e) )
+
+    def output_options(self, args):
+        # options affecting the records returned by process_file, see --incremental
+        options = { 'app': type(self).__name__ }
+        if args.where is not None:
+            options[ 'where' ] = str( args.where )
+        if args.blob_dir is not None:
+            options[ 'blob_dir' ] = os.path.abspath( args.blob_dir )
+        return options
+
+    def mk_blob_store(self, args):
+        if args.blob_dir is None:
+            return None
+        uri_base = None
+        if args.output_path is not None:
+            uri_base = os.path.dirname( os.path.abspath( args.output_path ) )
+        return BlobStore( args.blob_dir, uri_base=uri_base )
+
+    def load_message(self, item):
+        # use as context manager, large files are memory mapped until it is closed
+        return DirectoryMessage.from_source( item, fast_mime=self.fast_mime )
+
+    def accept_vcard(self, vcard_data):
+        # --where, evaluated before the card is parsed
+        return self.where is None or self.where.match_text( vcard_data )
+
+    def load_card(self, item):
+        # None if the card is not selected by --where
+        with self.load_message( item ) as dm:
+            vcard_data = dm.extract_vcard()
+        if not self.accept_vcard( vcard_data ):
+            return None
+        return vcard.parser.parse_vcard( vcard_data )
+
+    def iter_input(self, args):
+        # yields eml file paths or MessageRef of messages in containers
+        if args.input_format == 'maildir':
+            # --files-from lists message files
+            items = itertools.chain( MaildirReader( args.input_path ),
+                                     FileIterator( file_lists=args.files_from ) )
+        elif args.input_format == 'mbox':
+            items = MboxReader( FileIterator( *args.input_path, file_lists=args.files_from ), variant=args.mbox_variant )
+        else:
+            items = FileIterator( *args.input_path, extensions=('eml',), file_lists=args.files_from, archives=True )
+        if args.limit_infiles >= 0:
+            items = itertools.islice( items, args.limit_infiles )
+        return items
+
+    def card_to_record(self, card, item):
+        # the output record of a card, must be picklable
+        # (and json serializable for --incremental)
+        raise NotImplementedError()
+
+    def process_file(self, item):
+        # executed in the worker processes, the return value must be picklable
+        # None for cards not selected by --where
+        card = self.load_card( item )
+        if card is None:
+            return None
+        return self.card_to_record( card, item )
+
+    def process_dedupe(self, item):
+        # executed in the worker processes, the card is merged in the main process
+        card = self.load_card( item )
+        if card is None:
+            return None
+        return card, dedupe_keys( card, self.dedupe_key_types )
+
+    def process_incremental(self, task):
+        # executed in the worker processes
+        if not isinstance( task, IncrementalTask ):
+            # messages in containers are not cached
+            return self.process_file( task )
+        if task.data is None:
+            digest = file_digest( task.file_path )
+            source = task.file_path
+        else:
+            # read ahead by --prefetch, the file is not read again
+            digest = data_digest( task.data )
+            source = PrefetchedRef( task.file_path, task.data )
+        if digest == task.digest:
+            return IncrementalResult( digest, unchanged=True )
+        return IncrementalResult( digest, self.process_file( source ) )
+
+    def iter_results(self, args, process_func=None):
+        # yields a TaskResult with the output record for each input message,
+        # or for each entity with --dedupe
+        if args.dedupe:
+            return self.iter_deduped( args )
+        return self.iter_processed( args, process_func=process_func )
+
+    def iter_deduped(self, args):
+        self.dedupe_key_types = tuple( args.dedupe_keys )
+        deduper = Deduper( spill_dir=args.spill_dir )
+        try:
+            for result in self.iter_processed( args, process_func=self.process_dedupe ):
+                card, keys = result.value
+                deduper.add( result.item, card, keys )
+
+            entity_count = 0
+            for item, card, count in deduper.iter_entities():
+                entity_count += 1
+                try:
+                    record = self.card_to_record( card, item )
+                except Exception as e:
+                    print( "Error:", e, file=sys.stderr )
+                    print( "Ignoring entity of:", item, file=sys.stderr )
+                    continue
+                yield TaskResult( item, value=record )
+            print( "cards:", deduper.card_count, "entities:", entity_count, file=sys.stderr )
+        finally:
+            deduper.close()
+
+    def iter_processed(self, args, process_func=None):
+        # process_func: called in place of process_file, unless --incremental is used
+        self.fast_mime = args.fast_mime
+        self.where = args.where
+        jobs = args.jobs
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+
+        executor = ParallelExecutor( jobs=jobs )
+        items = self.iter_input( args )
+        item_count = 0
+        filtered_count = 0
+        func = self.process_file
+        if process_func is not None:
+            func = process_func
+        state = None
+        if args.incremental_state is not None:
+            state = IncrementalState( args.incremental_state, self.output_options( args ) )
+            items = state.plan( items )
+            func = self.process_incremental
+        if args.prefetch > 0:
+            items = Prefetcher( depth=args.prefetch ).iter( items )
+
+        completed = False
+        try:
+            for result in executor.map( func, items ):
+                item_count += 1
+                print( result.item, file=sys.stderr )
+                if result.failed:
+                    sys.stderr.write( result.error_traceback )
+                    print( "Error:", result.error, file=sys.stderr )
+                    print("Ignoring file:", result.item, file=sys.stderr )
+                    continue
+                if isinstance( result.item, IncrementalTask ):
+                    record = state.update( result.item, result.value )
+                    result = TaskResult( result.item.file_path, value=record )
+                if result.value is None:
+                    # not selected by --where
+                    filtered_count += 1
+                    continue
+                yield result
+            completed = True
+        finally:
+            if state is not None:
+                # records of vanished files are only dropped after a full run
+                state.close( prune=completed and args.limit_infiles < 0 )
+
+        print( "file count:", item_count, file=sys.stderr )
+        if self.where is not None:
+            print( "selected:", item_count - filtered_count, "filtered:", filtered_count, file=sys.stderr )
+        if state is not None:
+            print( "cached:", state.cached_count, "updated:", state.updated_count, file=sys.stderr )
+
+class ExportCsvApp( ExportApp ):
+
+    def card_to_record(self, card, item):
+        row = {}
+        for key, value in source_fields( item ).items():
+            if key == 'file':
+                row[ 'FILE_PATH' ] = value
+            else:
+                row[ 'FILE_'+key.upper() ] = value
+        row.update( self.strategy.vcard_to_row( card ) )
+        return row
+
+    def process_columns(self, item):
+        # discovery pass: only the column names of the row, and whether they have a value
+        row = self.process_file( item )
+        if row is None:
+            return None
+        return [ (name, not csv_export.is_na( value )) for name, value in row.items() ]
+
+    def parse_args(self, export_p):
+        super().parse_args( export_p )
+        schema_g = export_p.add_mutually_exclusive_group()
+        schema_g.add_argument('--schema', metavar='FILE', dest='schema_path', default=None,
+                              help="Write the columns listed in FILE, one name per line, while the files are processed. "
+                                   "Values of other columns are dropped. Does not keep the rows in memory." )
+        schema_g.add_argument('--discover-columns', dest='discover_columns', default=False, action='store_true',
+                              help="Process the input twice: collect the columns first, then write the rows while "
+                                   "the files are processed. Does not keep the rows in memory." )
+
+    def discover_columns(self, args):
+        # same columns and order as CsvTable followed by drop_na_columns
+        has_value = {}
+        for result in self.iter_results( args, process_func=self.process_columns ):
+            columns = result.value
+            if isinstance( columns, dict ):
+                # cached row from --incremental
+                columns = [ (name, not csv_export.is_na( value )) for name, value in columns.items() ]
+            for name, value_set in columns:
+                has_value[ name ] = has_value.get( name, False ) or value_set
+        return [ name for name, value_set in has_value.items() if value_set ]
+
+    def load_columns(self, args):
+        # column list of --schema or --discover-columns
+        if args.schema_path is not None:
+            return csv_export.load_schema( args.schema_path )
+        if '-' in args.files_from:
+            print( "Error: --discover-columns reads the input twice, stdin can not be used", file=sys.stderr )
+            sys.exit( 1 )
+        return self.discover_columns( args )
+
+    def main_stream(self, args):
+        columns = self.load_columns( args )
+
+        with FileOutput( args.output_path, "w" ) as out_fh:
+            writer = csv_export.CsvStreamWriter( out_fh, columns )
+            for result in self.iter_results( args ):
+                writer.write_row( result.value )
+
+        print( "rows:", writer.row_count, "columns:", len(columns), file=sys.stderr )
+        if writer.dropped_columns:
+            print( "Warning: dropped the values of columns not in the schema:",
+                   " ".join( sorted( writer.dropped_columns ) ), file=sys.stderr )
+
     def main(self, args ):
-        strategy = csv_export.FullCsvExportStrategy()
+        self.strategy = csv_export.FullCsvExportStrategy()
+        self.strategy.blob_store = self.mk_blob_store( args )
+        if args.schema_path is not None or args.discover_columns:
+            self.main_stream( args )
+            return
+
         table = csv_export.CsvTable()
-        file_it = FileIterator( args.input_path, extensions=('eml',), limit=args.limit_infiles )
-
-        for file_path in file_it:
-            print( file_path, file=sys.stderr )
-            try:
-                dm = DirectoryMessage.from_file( file_path )
-                card = vcard.parser.parse_vcard( dm.extract_vcard() )
-
-                data = {
-                    'FILE_PATH': [file_path],
-                }
-                file_df = pd.DataFrame( data )
-                vcard_df = strategy.vcard_to_df( card )
-                df = file_df.join( vcard_df )
-                table.append_row_df( df )
-            except Exception as e:
-                traceback.print_exc()
-                print( "Error:", str(e), file=sys.stderr )
-                print("Ignoring file:", file_path, file=sys.stderr )
-
-        print( "file count:", file_it.item_count, file=sys.stderr )
+
+        # rows arrive in input order, the table merges the column sets of all rows
+        for result in self.iter_results( args ):
+            table.append_row( result.value )
 
         table.drop_na_columns()
         print( table.df.info(), file=sys.stderr )
         
         table.write_file( args.output_path )
 
-class ExportVcfApp( object ):
-    
+class ExportParquetApp( ExportCsvApp ):
+    # same rows as csv_export, written as typed columns
+
     def parse_args(self, export_p):
-        export_p.add_argument('input_path', metavar="PATH", 
-                              help="Path to a input eml file or a directory to search for eml files" )
-        export_p.add_argument('--limit', metavar='COUNT', dest='limit_infiles', type=int, default=-1,
-                              help="Limit processing to the first COUNT found files. Defaults to -1, unlimited." )
-        export_p.add_argument('--out-file','-o', metavar='FILE.CSV', dest='output_path', default=None,
-                              help="Path to the output file. If omitted, stdout is used." )
-        
+        super().parse_args( export_p )
+        export_p.add_argument('--row-group-size', metavar='ROWS', dest='row_group_size', type=int, default=10000,
+                              help="Rows per parquet row group, bounds the memory use. Defaults to 10000." )
+
     def main(self, args ):
-        strategy = vcf_export.DefaultVcfExportStrategy()
-        file_it = FileIterator( args.input_path, extensions=('eml',), limit=args.limit_infiles )
+        if parquet_export.pa is None:
+            print( "Error: parquet_export requires the pyarrow package", file=sys.stderr )
+            sys.exit( 1 )
+        if args.output_path is None and sys.stdout.isatty():
+            print( "Error: refusing to write parquet to a terminal, use --out-file", file=sys.stderr )
+            sys.exit( 1 )
 
-        with FileOutput( args.output_path, "w" ) as out_fh:
-            for file_path in file_it:
-                print( file_path, file=sys.stderr )
-                try:
-                    dm = DirectoryMessage.from_file( file_path )
-                    card = vcard.parser.parse_vcard( dm.extract_vcard() )
-                    card_vcf = strategy.serialize_vcard( card )
-                    
-                    out_fh.write( card_vcf+'\n\n' )
-                except Exception as e:
-                    traceback.print_exc()
-                    print( "Error:", str(e), file=sys.stderr )
-                    print("Ignoring file:", file_path, file=sys.stderr )
+        self.strategy = csv_export.FullCsvExportStrategy()
+        self.strategy.blob_store = self.mk_blob_store( args )
+        if args.schema_path is not None or args.discover_columns:
+            self.main_parquet_stream( args )
+            return
+
+        out_dir = None
+        if args.output_path is not None:
+            out_dir = os.path.dirname( os.path.abspath( args.output_path ) )
+        table = parquet_export.ParquetTable( row_group_size=args.row_group_size, spool_dir=out_dir )
+
+        for result in self.iter_results( args ):
+            table.append_row( result.value )
+
+        table.write_file( args.output_path )
+        print( table.info(), file=sys.stderr )
+
+    def main_parquet_stream(self, args):
+        # row groups are written as the files are processed, an interrupted run
+        # leaves a valid file with the groups written so far
+        columns = self.load_columns( args )
+
+        with parquet_export.ParquetStreamWriter( args.output_path, columns, row_group_size=args.row_group_size ) as writer:
+            for result in self.iter_results( args ):
+                writer.append_row( result.value )
+
+        print( writer.info(), file=sys.stderr )
+        if writer.dropped_columns:
+            print( "Warning: dropped the values of columns not in the schema:",
+                   " ".join( sorted( writer.dropped_columns ) ), file=sys.stderr )
+
+class ExportSqliteApp( ExportApp ):
+
+    def parse_args(self, export_p):
+        super().parse_args( export_p )
+        export_p.add_argument('--batch-size', metavar='CARDS', dest='batch_size', type=int, default=1000,
+                              help="Cards inserted per transaction. Defaults to 1000." )
+
+    def card_to_record(self, card, item):
+        return {
+            'source': source_fields( item ),
+            'attrs': self.strategy.vcard_to_record( card ),
+        }
+
+    def main(self, args ):
+        if args.output_path is None:
+            print( "Error: sqlite_export requires --out-file", file=sys.stderr )
+            sys.exit( 1 )
+
+        self.strategy = sqlite_export.SqliteExportStrategy()
+        self.strategy.blob_store = self.mk_blob_store( args )
+        sink = sqlite_export.SqliteSink( args.output_path, batch_size=args.batch_size )
+
+        for result in self.iter_results( args ):
+            sink.add( result.value[ 'source' ], result.value[ 'attrs' ] )
+        sink.close()
+        print( "cards:", sink.card_count, "attributes:", sink.attribute_id, file=sys.stderr )
+
+class ExportVcfApp( ExportApp ):
 
-        print( "file count:", file_it.item_count, file=sys.stderr )
+    def parse_args(self, export_p):
+        super().parse_args( export_p )
+        export_p.add_argument('--fold-octets', dest='fold_octets', default=False, action='store_true',
+                              help="Fold lines after 75 UTF-8 octets instead of 75 characters (RFC 2425)" )
+
+    def output_options(self, args):
+        options = super().output_options( args )
+        options[ 'fold_octets' ] = args.fold_octets
+        return options
+
+    def load_card(self, item):
+        # embeds the photos, logos and sounds referenced by cid: URIs
+        with self.load_message( item ) as dm:
+            vcard_data = dm.extract_vcard()
+            if not self.accept_vcard( vcard_data ):
+                return None
+            return self.strategy.message_to_vcard( dm, vcard_data=vcard_data )
+
+    def card_to_record(self, card, item):
+        # messages in archives and mbox files are marked with their source,
+        # the cards of plain files are written unchanged
+        source = source_fields( item )
+        if len( source ) > 1:
+            self.strategy.add_source_attr( card, source )
+        return self.strategy.serialize_vcard( card )
+
+    def main(self, args ):
+        self.strategy = vcf_export.DefaultVcfExportStrategy( fold_octets=args.fold_octets )
+        self.strategy.blob_store = self.mk_blob_store( args )
 
-class ExportJsonApp( object ):
+        with FileOutput( args.output_path, "w" ) as out_fh:
+            for result in self.iter_results( args ):
+                out_fh.write( result.value+'\n\n' )
+
+class ExportJsonApp( ExportApp ):
     
+    def __init__(self):
+        super().__init__()
+        self.indent = None
+
     def parse_args(self, export_p):
-        export_p.add_argument('input_path', metavar="PATH", 
-                              help="Path to a input eml file or a directory to search for eml files" )
-        export_p.add_argument('--limit', metavar='COUNT', dest='limit_infiles', type=int, default=-1,
-                              help="Limit processing to the first COUNT found files. Defaults to -1, unlimited." )
-        export_p.add_argument('--out-file','-o', metavar='FILE.CSV', dest='output_path', default=None,
-                              help="Path to the output file. If omitted, stdout is used." )
+        super().parse_args( export_p )
         export_p.add_argument('--pretty', dest='do_pretty', default=False, action='store_true',
-                              help="Pretty print json" )
-        
+                              help="Pretty print json. Ignored for jsonl." )
+        export_p.add_argument('--format', dest='json_format', choices=('json','jsonl'), default='json',
+                              help="json: a single array of records. jsonl: one record per line (JSON Lines). Defaults to json." )
+        export_p.add_argument('--flush-every', metavar='COUNT', dest='flush_every', type=int, default=0,
+                              help="Flush the output after every COUNT records. Defaults to 0, leave it to the OS." )
+
+    def _indent(self, args):
+        if args.do_pretty and args.json_format == 'json':
+            return "  "
+        return None
+
+    def output_options(self, args):
+        options = super().output_options( args )
+        options[ 'pretty' ] = self._indent( args ) is not None
+        return options
+
+    def card_to_record(self, card, item):
+        data = {}
+        for key, value in source_fields( item ).items():
+            data[ "source-"+key ] = value
+        data[ "vcard" ] = self.strategy.vcard_to_native( card )
+        return json.dumps( data, indent=self.indent )
+
     def main(self, args ):
-        strategy = json_export.DefaultJsonExportStrategy()
-        file_it = FileIterator( args.input_path, extensions=('eml',), limit=args.limit_infiles )
+        self.strategy = json_export.DefaultJsonExportStrategy()
+        self.strategy.blob_store = self.mk_blob_store( args )
+        self.indent = self._indent( args )
 
         with FileOutput( args.output_path, "w" ) as out_fh:
-            out_fh.write( "[" )
-            has_comma = True
-            for file_path in file_it:
-                print( file_path, file=sys.stderr )
-                if not has_comma:
-                    out_fh.write( ",\n" )
-                    has_comma = True
+            if args.json_format == 'jsonl':
+                self.write_jsonl( args, out_fh )
+            else:
+                self.write_json( args, out_fh )
 
-                try:
-                    dm = DirectoryMessage.from_file( file_path )
-                    card = vcard.parser.parse_vcard( dm.extract_vcard() )
-                    data = {
-                        "source-file": file_path
-                    }
-                    data[ "vcard" ] = strategy.vcard_to_native( card )
-                    
-                    indent = None
-                    if args.do_pretty:
-                        indent = "  "
-                    json_out = json.dumps( data, indent=indent )
-                    out_fh.write( json_out )
-                    has_comma = False
-                except Exception as e:
-                    traceback.print_exc()
-                    print( "Error:", str(e), file=sys.stderr )
-                    print("Ignoring file:", file_path, file=sys.stderr )
-            out_fh.write( "]" )
+    def _flush_if_due(self, args, out_fh, record_count):
+        if args.flush_every > 0 and record_count % args.flush_every == 0:
+            out_fh.flush()
+
+    def write_json(self, args, out_fh):
+        out_fh.write( "[" )
+        count = 0
+        for result in self.iter_results( args ):
+            if count != 0:
+                out_fh.write( ",\n" )
+            out_fh.write( result.value )
+            count += 1
+            self._flush_if_due( args, out_fh, count )
+        out_fh.write( "]" )
 
-        print( "file count:", file_it.item_count, file=sys.stderr )
+    def write_jsonl(self, args, out_fh):
+        # every line is a complete record, a crash leaves only complete lines behind
+        count = 0
+        for result in self.iter_results( args ):
+            out_fh.write( result.value )
+            out_fh.write( "\n" )
+            count += 1
+            self._flush_if_due( args, out_fh, count )
         
 
 class CliApp( object ):
@@ -138,6 +518,8 @@ class CliApp( object ):
         self.csv_app = ExportCsvApp()
         self.vcf_app = ExportVcfApp()
         self.json_app = ExportJsonApp()
+        self.parquet_app = ExportParquetApp()
+        self.sqlite_app = ExportSqliteApp()
 
     def parse_args(self):
         main_p = argparse.ArgumentParser()
@@ -154,11 +536,23 @@ class CliApp( object ):
         export_p = main_sub_p.add_parser( 'json_export', help="Export eml files to json" )
         export_p.set_defaults( subparser_callback=self.json_app.main )
         self.json_app.parse_args( export_p )
+
+        export_p = main_sub_p.add_parser( 'parquet_export', help="Export eml files to parquet" )
+        export_p.set_defaults( subparser_callback=self.parquet_app.main )
+        self.parquet_app.parse_args( export_p )
+
+        export_p = main_sub_p.add_parser( 'sqlite_export', help="Export eml files to a normalized sqlite database" )
+        export_p.set_defaults( subparser_callback=self.sqlite_app.main )
+        self.sqlite_app.parse_args( export_p )
         
         self.args = main_p.parse_args()
         if not hasattr(self.args, 'subparser_callback'):
             main_p.print_help()
             sys.exit( 2 )
+        if not self.args.input_path and not self.args.files_from:
+            main_p.error( "no input, give a PATH or --files-from" )
+        if self.args.dedupe and self.args.incremental_state is not None:
+            main_p.error( "--dedupe can not be combined with --incremental" )
 
     def main(self):
         self.args.subparser_callback( self.args )
@@ -0,0 +1,96 @@
+import os
+import os.path
+import hashlib
+import tempfile
+
+class StoredBlob( object ):
+
+    def __init__(self, digest, size, uri):
+        self.digest = digest
+        self.size = size
+        # path of the blob relative to the store's uri_base, using "/"
+        self.uri = uri
+
+    @property
+    def hash_ref(self):
+        return BlobStore.hash_name + ':' + self.digest
+
+class BlobStore( object ):
+    # content addressed store for binary attribute payloads (PHOTO, LOGO, SOUND)
+    # Every payload is written once, named by its hash. Several processes may
+    # share a blob_dir, blobs are written to a temporary file and renamed.
+
+    # The digest names the blob, a collision would silently swap two payloads,
+    # so a cryptographic hash is used. blake2b is the fastest of those in hashlib.
+    hash_name = 'blake2b-160'
+
+    def __init__(self, blob_dir, uri_base=None):
+        self.blob_dir = blob_dir
+        # the URIs are relative to this directory, e.g. the directory of the output file
+        if uri_base is None:
+            uri_base = os.getcwd()
+        self.uri_base = uri_base
+        # size prefilter: payload size => digests of the blobs known to exist,
+        # payloads of a size not in blob_dir are written without checking for duplicates
+        self.known_digests = {}
+        # sizes of the blobs in blob_dir when the first payload was stored
+        self.disk_sizes = None
+        os.makedirs( blob_dir, exist_ok=True )
+
+    @staticmethod
+    def digest(data):
+        return hashlib.blake2b( data, digest_size=20 ).hexdigest()
+
+    def blob_path(self, digest):
+        # fan out over 256 sub directories
+        return os.path.join( self.blob_dir, digest[:2], digest )
+
+    def blob_uri(self, digest):
+        rel_path = os.path.relpath( self.blob_path(digest), self.uri_base )
+        return rel_path.replace( os.sep, '/' )
+
+    def store(self, data):
+        data = memoryview( data )
+        size = len( data )
+        digest = self.digest( data )
+
+        if self.disk_sizes is None:
+            self.disk_sizes = self._scan_sizes()
+
+        size_digests = self.known_digests.setdefault( size, set() )
+        if digest not in size_digests:
+            path = self.blob_path( digest )
+            # a size neither stored in this run nor found in blob_dir can not be a
+            # duplicate, the existence check is skipped. A concurrent writer of the
+            # same blob is harmless, the rename replaces it with the same data.
+            may_exist = size_digests or size in self.disk_sizes
+            if not may_exist or not os.path.exists( path ):
+                self._write( path, data )
+            size_digests.add( digest )
+
+        return StoredBlob( digest, size, self.blob_uri( digest ) )
+
+    def _scan_sizes(self):
+        sizes = set()
+        with os.scandir( self.blob_dir ) as fan_entries:
+            for fan_entry in fan_entries:
+                if not fan_entry.is_dir():
+                    continue
+                with os.scandir( fan_entry.path ) as entries:
+                    for entry in entries:
+                        if not entry.name.startswith( '.tmp-' ):
+                            sizes.add( entry.stat().st_size )
+        return sizes
+
+    def _write(self, path, data):
+        blob_dir = os.path.dirname( path )
+        os.makedirs( blob_dir, exist_ok=True )
+        fd, tmp_path = tempfile.mkstemp( dir=blob_dir, prefix='.tmp-' )
+        try:
+            with os.fdopen( fd, 'wb' ) as fp:
+                fp.write( data )
+            os.replace( tmp_path, path )
+        except BaseException:
+            if os.path.exists( tmp_path ):
+                os.unlink( tmp_path )
+            raise
@@ -1,23 +1,94 @@
 import csv
+import math
 import sys
 
-import pandas as pd
-import numpy as np
+from functools import partial
 
-from .vcard import vAttribute
 from .vcard.attributes import *
+from .vcard.attributes.dispatch import AttributeDispatcher
+
+# missing values, written as empty string
+NA = float( 'nan' )
+
+def is_na( value ):
+    return value is None or ( isinstance( value, float ) and math.isnan( value ) )
+
+def load_schema( schema_path ):
+    # column names, one per line
+    with open( schema_path, 'r' ) as fh:
+        return [ line.strip() for line in fh if line.strip() ]
+
+class CsvStreamWriter( object ):
+    # writes rows with a fixed column list as they arrive, without pandas
+    # the format is the one of CsvTable.write_file
+
+    def __init__(self, out_fh, columns, sep='|'):
+        self.columns = list( columns )
+        self.column_set = set( self.columns )
+        self.writer = csv.writer( out_fh, delimiter=sep, quoting=csv.QUOTE_ALL, lineterminator='\n' )
+        self.writer.writerow( self.columns )
+        self.row_count = 0
+        # columns with values which are not in self.columns
+        self.dropped_columns = set()
+
+    def write_row(self, row):
+        # row is a dict column name => scalar value
+        values = []
+        for name in self.columns:
+            value = row.get( name )
+            values.append( '' if is_na( value ) else value )
+        self.writer.writerow( values )
+        self.row_count += 1
+
+        if len(row) > len(self.columns) or not self.column_set.issuperset( row ):
+            for name, value in row.items():
+                if name not in self.column_set and not is_na( value ):
+                    self.dropped_columns.add( name )
 
 class CsvTable( object ):
     
     def __init__(self, sep='|'):
-        self.df = pd.DataFrame()
         self.sep = sep
+        # columnar accumulator: column name => (row numbers, values)
+        # the columns are sparse, most of them are only set for a few rows
+        self.columns = {}
+        self.row_count = 0
+        self._df = None
+
+    @property
+    def df(self):
+        # the frame is built once from the accumulated columns
+        if self._df is None:
+            import pandas as pd
+            index = pd.RangeIndex( self.row_count )
+            data = {}
+            for name, (rows, values) in self.columns.items():
+                data[ name ] = pd.Series( values, index=rows, dtype=object )
+            self._df = pd.DataFrame( data, index=index, columns=list(self.columns) )
+        return self._df
+
+    def append_row(self, row):
+        # row is a dict column name => scalar value
+        row_num = self.row_count
+        for name, value in row.items():
+            column = self.columns.get( name )
+            if column is None:
+                column = ( [], [] )
+                self.columns[ name ] = column
+            column[0].append( row_num )
+            column[1].append( value )
+        self.row_count += 1
+        self._df = None
     
     def append_row_df(self, row_df):
-        self.df = self.df.append( row_df, ignore_index=True )
+        for row in row_df.to_dict( orient='records' ):
+            self.append_row( row )
     
     def drop_na_columns(self): 
-        self.df.dropna( axis=1, how='all', inplace=True )
+        for name in list( self.columns ):
+            if all( is_na(v) for v in self.columns[ name ][1] ):
+                del self.columns[ name ]
+        self._df = None
 
     def write_file(self, file_path=None):
         if file_path is None:
@@ -33,18 +104,56 @@ class CsvTable( object ):
 
 class CsvExportStrategy( object ):
     def __init__(self):
-        pass
+        # optional BlobStore, binary payloads are replaced by a reference into it
+        self.blob_store = None
 
 class FullCsvExportStrategy( CsvExportStrategy ):
     
     def __init__(self):
         super().__init__()
         self.rdata = {}
+
+        # handlers are called with (attr, column prefix)
+        self.attr_visitors = AttributeDispatcher( default=self.visit_unknown_attr )
+        self.attr_visitors.register_all( [
+            ( vFnAttribute,         partial( self.visit_text_attr, attr_name='fn' ) ),
+            ( vNameAttribute,       self.visit_attr_name ),
+            ( vNicknameAttribute,   partial( self.visit_text_list_attr, attr_name='nicknames' ) ),
+            ( vBdayAttribute,       partial( self.visit_text_attr, attr_name='birthday' ) ),
+            ( vAdrAttribute,        self.visit_attr_adr ),
+            ( vLabelAttribute,      partial( self.visit_text_attr, attr_name='label' ) ),
+            ( vTelAttribute,        partial( self.visit_text_attr, attr_name='tel' ) ),
+            ( vEmailAttribute,      partial( self.visit_text_attr, attr_name='email' ) ),
+            ( vMailerAttribute,     partial( self.visit_text_attr, attr_name='mailer' ) ),
+            ( vTzAttribute,         partial( self.visit_text_attr, attr_name='time_zone' ) ),
+            ( vGeoAttribute,        self.visit_attr_geo ),
+            ( vTitleAttribute,      partial( self.visit_text_attr, attr_name='title' ) ),
+            ( vRoleAttribute,       partial( self.visit_text_attr, attr_name='role' ) ),
+            ( vAgentAttribute,      partial( self.visit_text_attr, attr_name='agent' ) ),
+            ( vOrgAttribute,        self.visit_attr_org ),
+            ( vCategoriesAttribute, partial( self.visit_text_list_attr, attr_name='categories' ) ),
+            ( vNoteAttribute,       partial( self.visit_text_attr, attr_name='note' ) ),
+            ( vProdidAttribute,     partial( self.visit_text_attr, attr_name='prodid' ) ),
+            ( vRevAttribute,        partial( self.visit_text_attr, attr_name='rev' ) ),
+            ( vSortstringAttribute, partial( self.visit_text_attr, attr_name='sort_string' ) ),
+            ( vUidAttribute,        partial( self.visit_text_attr, attr_name='uid' ) ),
+            ( vUrlAttribute,        partial( self.visit_text_attr, attr_name='url' ) ),
+            ( vVersionAttribute,    partial( self.visit_text_attr, attr_name='version' ) ),
+            ( vClassAttribute,      partial( self.visit_text_attr, attr_name='class' ) ),
+            ( vImageAttribute,      self.visit_binuri_attr_value ),
+            ( vSoundAttribute,      self.visit_binuri_attr_value ),
+            # TODO: KEY attribute
+
+            ( vSourceAttribute,     partial( self.visit_text_attr, attr_name='source' ) ),
+            ( vProfileAttribute,    partial( self.visit_text_attr, attr_name='profile' ) ),
+
+            ( vImppAttribute,       partial( self.visit_text_attr, attr_name='impp' ) ),
+        ] )
     
     def _set_data(self, column_name, value, empty_is_na=False ):
         if empty_is_na and value == '':
-            value = np.nan
-        self.rdata[ column_name ] = [ value ]
+            value = NA
+        self.rdata[ column_name ] = value
     
     def _set_data_list( self, column_name, value_list, empty_is_na=False ):
         for i in range( len(value_list) ):
@@ -52,6 +161,12 @@ class FullCsvExportStrategy( CsvExportStrategy ):
             self._set_data( item_col, str(value_list[i]), empty_is_na )
 
     def vcard_to_df(self, vcard):
+        import pandas as pd
+        row = self.vcard_to_row( vcard )
+        return pd.DataFrame( { k: [v] for k, v in row.items() } )
+
+    def vcard_to_row(self, vcard):
+        # returns a dict column name => value
         self.rdata = {}
 
         name_counts = {}
@@ -73,75 +188,22 @@ class FullCsvExportStrategy( CsvExportStrategy ):
             self._set_data( col_pref+'PARAM', param_value, empty_is_na=True )
             self.visit_attr( attr, col_pref )
 
-        df = pd.DataFrame( self.rdata )
-        return df
+        return self.rdata
     
     def visit_attr(self, attr, prefix):
+        self.attr_visitors( attr, prefix )
+
+    def visit_unknown_attr(self, attr, prefix):
+        self._set_data( prefix+'VALUE_ENC', str(attr.value), empty_is_na=False )
+
+    def visit_text_attr(self, attr, prefix, attr_name):
+        self.visit_simple_text_attr( attr, attr_name, prefix+'VALUE' )
+
+    def visit_text_list_attr(self, attr, prefix, attr_name):
+        self.visit_simple_text_list_attr( attr, attr_name, prefix+'VALUE' )
 
-        if isinstance( attr, vFnAttribute ):
-            self.visit_simple_text_attr( attr, 'fn', prefix+'VALUE' )
-        elif isinstance( attr, vNameAttribute ):
-            self.visit_attr_name( attr, prefix )
-        elif isinstance( attr, vNicknameAttribute ):
-            self.visit_simple_text_list_attr( attr, 'nickname', prefix+'VALUE' )
-        elif isinstance( attr, vBdayAttribute ):
-            self.visit_simple_text_attr( attr, 'birthday', prefix+'VALUE' )
-        elif isinstance( attr, vAdrAttribute ):
-            self.visit_attr_adr( attr, prefix )
-        elif isinstance( attr, vLabelAttribute ):
-            self.visit_simple_text_attr( attr, 'label', prefix+'VALUE' )
-        elif isinstance( attr, vTelAttribute ):
-            self.visit_simple_text_attr( attr, 'tel', prefix+'VALUE' )
-        elif isinstance( attr, vEmailAttribute ):
-            self.visit_simple_text_attr( attr, 'email', prefix+'VALUE' )
-        elif isinstance( attr, vMailerAttribute ):
-            self.visit_simple_text_attr( attr, 'mailer', prefix+'VALUE' )
-        elif isinstance( attr, vTzAttribute ):
-            self.visit_simple_text_attr( attr, 'time_zone', prefix+'VALUE' )
-        elif isinstance( attr, vGeoAttribute ):
-            self.visit_attr_geo( attr, prefix )
-        elif isinstance( attr, vTitleAttribute ):
-            self.visit_simple_text_attr( attr, 'title', prefix+'VALUE' )
-        elif isinstance( attr, vRoleAttribute ):
-            self.visit_simple_text_attr( attr, 'role', prefix+'VALUE' )
-        elif isinstance( attr, vAgentAttribute ):
-            self.visit_simple_text_attr( attr, 'agent', prefix+'VALUE' )
-        elif isinstance( attr, vOrgAttribute ):
-            self.visit_attr_org( attr, prefix )
-        elif isinstance( attr, vCategoriesAttribute ):
-            self.visit_simple_text_list_attr( attr, 'categories', prefix+'VALUE' )
-        elif isinstance( attr, vNoteAttribute ):
-            self.visit_simple_text_attr( attr, 'note', prefix+'VALUE' )
-        elif isinstance( attr, vProdidAttribute ):
-            self.visit_simple_text_attr( attr, 'prodid', prefix+'VALUE' )
-        elif isinstance( attr, vRevAttribute ):
-            self.visit_simple_text_attr( attr, 'rev', prefix+'VALUE' )
-        elif isinstance( attr, vSortstringAttribute ):
-            self.visit_simple_text_attr( attr, 'sort_string', prefix+'VALUE' )
-        elif isinstance( attr, vUidAttribute ):
-            self.visit_simple_text_attr( attr, 'uid', prefix+'VALUE' )
-        elif isinstance( attr, vUrlAttribute ):
-            self.visit_simple_text_attr( attr, 'url', prefix+'VALUE' )
-        elif isinstance( attr, vVersionAttribute ):
-            self.visit_simple_text_attr( attr, 'version', prefix+'VALUE' )
-        elif isinstance( attr, vClassAttribute ):
-            self.visit_simple_text_attr( attr, 'class', prefix+'VALUE' )
-        elif isinstance( attr, vImageAttribute ):
-            self.visit_binuri_attr( attr, prefix+'VALUE' )
-        elif isinstance( attr, vSoundAttribute ):
-            self.visit_binuri_attr( attr, prefix+'VALUE' )
-        # TODO: KEY attribute
-
-        elif isinstance( attr, vSourceAttribute ):
-            self.visit_simple_text_attr( attr, 'source', prefix+'VALUE' )
-        elif isinstance( attr, vProfileAttribute ):
-            self.visit_simple_text_attr( attr, 'profile', prefix+'VALUE' )
-
-        elif isinstance( attr, vImppAttribute ):
-            self.visit_simple_text_attr( attr, 'impp', prefix+'VALUE' )
-
-        elif isinstance( attr, vAttribute ):
-            self._set_data( prefix+'VALUE_ENC', str(attr.value), empty_is_na=False )
+    def visit_binuri_attr_value(self, attr, prefix):
+        self.visit_binuri_attr( attr, prefix+'VALUE' )
     
     def visit_simple_text_attr(self, attr, attr_name, column_name):
         self._set_data( column_name, str( getattr(attr, attr_name) ) )
@@ -152,8 +214,10 @@ class FullCsvExportStrategy( CsvExportStrategy ):
     def visit_binuri_attr(self, attr, column_name):
         if attr.has_uri:
             self._set_data( column_name, str( attr.uri ) )
+        elif self.blob_store is not None:
+            self._set_data( column_name, self.blob_store.store( attr.data.data ).uri )
         else:
-            self._set_data( column_name, attr.uri.to_base64() )
+            self._set_data( column_name, attr.data.to_base64() )
 
     def visit_attr_name(self, attr, prefix):
         self._set_data_list( prefix+'FAMILY', attr.family_names )
@@ -172,8 +236,9 @@ class FullCsvExportStrategy( CsvExportStrategy ):
         self._set_data_list( prefix+'COUNTRY', attr.country )
 
     def visit_attr_geo(self, attr, prefix):
-        self._set_data( prefix+'LAT', str( attr.latitude ) )
-        self._set_data( prefix+'LON', str( attr.longitude ) )
+        # the components are value lists, RFC2426 allows one float each
+        self._set_data( prefix+'LAT', ",".join( str(v) for v in attr.latitude ) )
+        self._set_data( prefix+'LON', ",".join( str(v) for v in attr.longitude ) )
 
     def visit_attr_org(self, attr, prefix):
         self._set_data( prefix+'ORG_NAME', str( attr.organization ) )
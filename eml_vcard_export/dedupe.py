@@ -0,0 +1,234 @@
+import array
+import hashlib
+import os.path
+import pickle
+import re
+import struct
+import tempfile
+
+from .vcard.attributes import *
+
+# Contact deduplication, see Deduper
+# Cards sharing a normalized key (UID, EMAIL, TEL, optionally FN) belong to the
+# same entity, transitively. The cards and keys are spilled to disk, the key
+# buckets are joined with a union-find over the card numbers, and the cards of
+# each entity are merged attribute by attribute.
+
+KEY_TYPES = ( 'uid', 'email', 'tel', 'fn' )
+DEFAULT_KEY_TYPES = ( 'uid', 'email', 'tel' )
+
+# a merged card keeps the first of these attributes
+SINGLE_VALUED_NAMES = ( 'begin', 'end', 'version', 'fn', 'n', 'uid', 'bday', 'rev', 'prodid',
+                        'sort-string', 'tz', 'geo', 'class', 'profile', 'photo', 'logo', 'sound' )
+
+_SPACE_RE = re.compile( r'\s+' )
+_NOT_DIGIT_RE = re.compile( r'[^0-9]' )
+# telephone numbers with fewer digits are too ambiguous to match on
+MIN_TEL_DIGITS = 6
+
+def normalize_text( value ):
+    return _SPACE_RE.sub( ' ', str(value) ).strip().casefold()
+
+def normalize_tel( value ):
+    value = str(value).strip()
+    digits = _NOT_DIGIT_RE.sub( '', value )
+    if value.startswith( '+' ):
+        digits = '+' + digits
+    return digits
+
+def dedupe_keys( card, key_types=DEFAULT_KEY_TYPES ):
+    # normalized blocking keys of card, executed in the workers
+    keys = set()
+    for attr in card.attrs:
+        if isinstance( attr, vUidAttribute ) and 'uid' in key_types:
+            key = normalize_text( attr.uid )
+        elif isinstance( attr, vEmailAttribute ) and 'email' in key_types:
+            key = normalize_text( attr.email )
+        elif isinstance( attr, vTelAttribute ) and 'tel' in key_types:
+            key = normalize_tel( attr.tel )
+            if len( key.lstrip('+') ) < MIN_TEL_DIGITS:
+                continue
+        elif isinstance( attr, vFnAttribute ) and 'fn' in key_types:
+            key = normalize_text( attr.fn )
+        else:
+            continue
+        if key:
+            keys.add( str(attr.name.key) + ':' + key )
+    return sorted( keys )
+
+def attr_merge_key( attr ):
+    # attributes with the same key are duplicates, the group is compared by merge_cards
+    if isinstance( attr, vTelAttribute ):
+        value = normalize_tel( attr.tel )
+    elif isinstance( attr, vAbstractBinaryUriAttr ):
+        value = str( attr.original_value )
+    else:
+        value = normalize_text( attr.original_value )
+    return ( attr.name.key, value )
+
+def _group_attrs( card ):
+    # group key => attributes of the group, in card order
+    groups = {}
+    for attr in card.attrs:
+        if attr.group.key:
+            groups.setdefault( attr.group.key, [] ).append( attr )
+    return groups
+
+def _free_group_name( used_groups ):
+    num = 1
+    while 'item{}'.format( num ) in used_groups:
+        num += 1
+    return 'item{}'.format( num )
+
+def merge_cards( cards ):
+    # merges the attributes of the following cards into the first one
+    # Groups only relate attributes within one card (e.g. item1.EMAIL and its
+    # item1.X-ABLabel), so the groups of each merged card get names not used in
+    # the first one, and a group is only dropped as a duplicate as a whole.
+    merged = cards[ 0 ]
+    seen_names = set()
+    seen = set()
+    for attr in merged.attrs:
+        seen_names.add( attr.name.key )
+        seen.add( attr_merge_key( attr ) )
+    used_groups = set()
+    seen_groups = set()
+    for group, attrs in _group_attrs( merged ).items():
+        used_groups.add( group )
+        seen_groups.add( frozenset( attr_merge_key( attr ) for attr in attrs ) )
+
+    new_attrs = []
+    for card in cards[ 1: ]:
+        # group key of card => new group name, None for a duplicate group
+        renames = {}
+        for group, attrs in _group_attrs( card ).items():
+            group_keys = frozenset( attr_merge_key( attr ) for attr in attrs )
+            if group_keys in seen_groups:
+                renames[ group ] = None
+                continue
+            new_group = str( attrs[0].group )
+            if group in used_groups:
+                new_group = _free_group_name( used_groups )
+            renames[ group ] = new_group
+            used_groups.add( new_group.casefold() )
+            seen_groups.add( group_keys )
+
+        for attr in card.attrs:
+            name = attr.name.key
+            if name in SINGLE_VALUED_NAMES and name in seen_names:
+                continue
+            key = attr_merge_key( attr )
+            group = attr.group.key
+            if group:
+                if renames[ group ] is None:
+                    continue
+                if renames[ group ] != str( attr.group ):
+                    attr.group = renames[ group ]
+            elif key in seen:
+                continue
+            seen_names.add( name )
+            seen.add( key )
+            new_attrs.append( attr )
+
+    # before END:VCARD
+    end = len( merged.attrs )
+    if end > 0 and merged.attrs[ -1 ].name.key == 'end':
+        end -= 1
+    merged.attrs[ end:end ] = new_attrs
+    return merged
+
+class Deduper( object ):
+    # Memory use is about 16 bytes per card plus one bucket: the cards are
+    # pickled to a spill file, the keys hashed to 8 bytes and spread over
+    # bucket_count files, each bucket is joined on its own.
+
+    _pair = struct.Struct( '<8sq' )
+
+    def __init__(self, spill_dir=None, bucket_count=64):
+        self.bucket_count = max( 1, bucket_count )
+        self.tmp_dir = tempfile.TemporaryDirectory( prefix='dedupe-', dir=spill_dir )
+        self.card_file = open( os.path.join( self.tmp_dir.name, 'cards' ), 'w+b' )
+        self.key_files = [ open( os.path.join( self.tmp_dir.name, 'keys.{}'.format(i) ), 'w+b' )
+                           for i in range( self.bucket_count ) ]
+        # card number => offset in card_file
+        self.offsets = array.array( 'q' )
+        # union-find forest, the root of an entity is its first card
+        self.parent = array.array( 'q' )
+
+    @property
+    def card_count(self):
+        return len( self.offsets )
+
+    def add(self, item, card, keys):
+        num = len( self.offsets )
+        self.offsets.append( self.card_file.tell() )
+        pickle.dump( (item, card), self.card_file, protocol=pickle.HIGHEST_PROTOCOL )
+        self.parent.append( num )
+        for key in keys:
+            digest = hashlib.blake2b( key.encode( 'utf-8' ), digest_size=8 ).digest()
+            self.key_files[ digest[0] % self.bucket_count ].write( self._pair.pack( digest, num ) )
+
+    def find(self, num):
+        parent = self.parent
+        while parent[ num ] != num:
+            # path halving
+            parent[ num ] = parent[ parent[ num ] ]
+            num = parent[ num ]
+        return num
+
+    def union(self, a, b):
+        a = self.find( a )
+        b = self.find( b )
+        if a < b:
+            self.parent[ b ] = a
+        elif b < a:
+            self.parent[ a ] = b
+
+    def _join_buckets(self):
+        for key_file in self.key_files:
+            key_file.seek( 0 )
+            first_card = {}
+            for digest, num in self._pair.iter_unpack( key_file.read() ):
+                other = first_card.setdefault( digest, num )
+                if other != num:
+                    self.union( other, num )
+            key_file.close()
+
+    def _load_card(self, num):
+        self.card_file.seek( self.offsets[ num ] )
+        return pickle.load( self.card_file )
+
+    def iter_entities(self):
+        # yields (item of the first card, merged card, number of cards) in the order of the first cards
+        self._join_buckets()
+        self.card_file.flush()
+
+        # range partitions of the roots, so the entities come out in order
+        count = self.card_count
+        part_files = [ open( os.path.join( self.tmp_dir.name, 'roots.{}'.format(i) ), 'w+b' )
+                       for i in range( self.bucket_count ) ]
+        pair = struct.Struct( '<qq' )
+        for num in range( count ):
+            root = self.find( num )
+            part_files[ root * self.bucket_count // count ].write( pair.pack( root, num ) )
+
+        for part_file in part_files:
+            part_file.seek( 0 )
+            members = sorted( pair.iter_unpack( part_file.read() ) )
+            part_file.close()
+            i = 0
+            while i < len( members ):
+                root = members[ i ][ 0 ]
+                j = i
+                while j < len( members ) and members[ j ][ 0 ] == root:
+                    j += 1
+                loaded = [ self._load_card( num ) for root, num in members[ i:j ] ]
+                item = loaded[ 0 ][ 0 ]
+                yield item, merge_cards( [ card for item, card in loaded ] ), j - i
+                i = j
+
+    def close(self):
+        self.card_file.close()
+        for key_file in self.key_files:
+            key_file.close()
+        self.tmp_dir.cleanup()
@@ -1,8 +1,13 @@
+import os
 import os.path
 import email
+import email.parser
 import email.policy
 import re
 import base64
+import binascii
+import mmap
+import quopri
 import urllib.parse
 
 class ContentId( object ):
@@ -33,6 +38,9 @@ class ContentId( object ):
         if not hasattr( other, 'id'):
             return False
         return self.id == other.id
+
+    def __hash__(self):
+        return hash( self.id )
     
     def __str__(self):
         return self.id
@@ -40,37 +48,234 @@ class ContentId( object ):
     def __repr__(self):
         return '<Conent-Id: {}>'.format( self.id )
 
+class MimeScanError( Exception ):
+    # raised by FastBodyExtractor for structures it does not handle
+    pass
+
+class FastBodyExtractor( object ):
+    # Finds the body part like email.message.EmailMessage.get_body(), but scans
+    # the raw message bytes for MIME boundaries and decodes only the selected
+    # part. Only the headers of the visited parts are parsed (compat32 policy).
+    # Raises MimeScanError if the message structure is unusual.
+
+    _HEADER_END_RE = re.compile( rb'\r\n\r\n|\n\n|\r\r' )
+    _HEADER_LINE_RE = re.compile( rb'[\x21-\x39\x3b-\x7e]+:|[ \t]' )
+    # rest of a delimiter line, after "--" boundary
+    _DELIM_TAIL_RE = re.compile( rb'(--)?[ \t]*(?:\r\n|\r|\n|$)' )
+    max_depth = 8
+
+    def __init__(self, preferencelist):
+        self.preferencelist = tuple( preferencelist )
+        self.header_parser = email.parser.BytesHeaderParser( policy=email.policy.compat32 )
+
+    def extract(self, data):
+        # data: bytes like object, e.g. bytes or mmap
+        best_prio = len( self.preferencelist )
+        best = None
+        for prio, headers, start, end in self._find_body( data, 0, len(data), 0 ):
+            if prio < best_prio:
+                best_prio = prio
+                best = ( headers, start, end )
+                if prio == 0:
+                    break
+        if best is None:
+            return None
+        return self._decode( data, *best )
+
+    def _parse_headers(self, data, start, end):
+        # returns (headers, body start)
+        m = self._HEADER_END_RE.search( data, start, end )
+        if m is None:
+            raise MimeScanError( "no end of headers found" )
+        if m.start() != start and self._HEADER_LINE_RE.match( data, start, m.start() ) is None:
+            raise MimeScanError( "malformed header block" )
+        headers = self.header_parser.parsebytes( bytes( data[ start:m.end() ] ) )
+        if headers.defects:
+            raise MimeScanError( "defective header block" )
+        return headers, m.end()
+
+    def _split_multipart(self, data, start, end, boundary):
+        # returns the (start, end) ranges of the parts, the line break before
+        # a delimiter line belongs to the delimiter
+        delim = b'--' + boundary.encode( "ascii" )
+        parts = []
+        part_start = None
+        pos = start
+        while True:
+            i = data.find( delim, pos, end )
+            if i < 0:
+                raise MimeScanError( "no closing MIME boundary" )
+            pos = i + 1
+            if i != start and data[ i-1 ] not in ( 0x0a, 0x0d ):
+                continue
+            m = self._DELIM_TAIL_RE.match( data, i+len(delim), end )
+            if m is None:
+                continue
+
+            delim_start = i
+            if i != start:
+                delim_start -= 1
+                if data[ i-1 ] == 0x0a and i-2 >= start and data[ i-2 ] == 0x0d:
+                    delim_start -= 1
+            if part_start is not None:
+                parts.append( (part_start, delim_start) )
+            if m.group(1) is not None:
+                return parts
+            part_start = m.end()
+            pos = m.end()
+
+    def _find_body(self, data, start, end, depth):
+        if depth > self.max_depth:
+            raise MimeScanError( "MIME structure too deep" )
+        headers, body_start = self._parse_headers( data, start, end )
+
+        disposition = headers.get( 'content-disposition' )
+        if disposition is not None and disposition.split(';')[0].strip().lower() == 'attachment':
+            return
+        maintype, subtype = headers.get_content_type().split( '/' )
+        if maintype == 'text':
+            if subtype in self.preferencelist:
+                yield ( self.preferencelist.index(subtype), headers, body_start, end )
+            return
+        if maintype != 'multipart':
+            return
+
+        boundary = headers.get_param( 'boundary' )
+        if not boundary or not isinstance( boundary, str ):
+            raise MimeScanError( "multipart without usable boundary" )
+        parts = self._split_multipart( data, body_start, end, boundary )
+
+        if subtype != 'related':
+            for part_start, part_end in parts:
+                yield from self._find_body( data, part_start, part_end, depth+1 )
+            return
+        if 'related' in self.preferencelist:
+            raise MimeScanError( "multipart/related as body is not supported" )
+        if headers.get_param( 'start' ):
+            raise MimeScanError( "multipart/related with start parameter" )
+        if parts:
+            yield from self._find_body( data, parts[0][0], parts[0][1], depth+1 )
+
+    def _decode(self, data, headers, start, end):
+        payload = bytes( data[ start:end ] )
+        cte = str( headers.get( 'content-transfer-encoding', '7bit' ) ).strip().lower()
+        if cte == 'base64':
+            try:
+                payload = binascii.a2b_base64( payload )
+            except binascii.Error as e:
+                raise MimeScanError( str(e) )
+        elif cte == 'quoted-printable':
+            payload = quopri.decodestring( payload )
+        elif cte not in ( '7bit', '8bit', 'binary' ):
+            raise MimeScanError( "unsupported transfer encoding" )
+
+        charset = headers.get_param( 'charset', 'ASCII' )
+        if not isinstance( charset, str ):
+            raise MimeScanError( "unsupported charset parameter" )
+        try:
+            return payload.decode( charset, errors='replace' )
+        except LookupError as e:
+            raise MimeScanError( str(e) )
+
 class DirectoryMessage( object ):
+    # get_body() preference, RFC2425 defines text/directory
+    body_preference = ( 'directory', 'vcard', 'plain' )
+    # files larger than this are memory mapped instead of read
+    mmap_threshold = 1 << 20
     
-    def __init__(self):
-        self.message = None
+    def __init__(self, fast_mime=False):
+        self._message = None
+        self._cid_index = None
+        self.raw = None
+        # try FastBodyExtractor before parsing the whole message
+        self.fast_mime = fast_mime
     
     @staticmethod
-    def from_file( file_path ):
-        dm = DirectoryMessage()
+    def from_file( file_path, fast_mime=False ):
+        dm = DirectoryMessage( fast_mime=fast_mime )
         dm.load_file( file_path )
         return dm
+
+    @staticmethod
+    def from_source( source, fast_mime=False ):
+        # source is a file path or a sources.MessageRef, e.g. a member of an archive
+        if isinstance( source, str ):
+            return DirectoryMessage.from_file( source, fast_mime=fast_mime )
+        return DirectoryMessage.from_bytes( source.read(), fast_mime=fast_mime )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        # unmaps a large file, an already parsed message stays usable
+        if isinstance( self.raw, mmap.mmap ):
+            self.raw.close()
+        self.raw = None
+
+    @staticmethod
+    def from_bytes( data, fast_mime=False ):
+        dm = DirectoryMessage( fast_mime=fast_mime )
+        dm.load_bytes( data )
+        return dm
     
     def load_file(self, file_path ):
         with open(file_path, 'rb') as fp:
-            self.message = email.message_from_binary_file(fp, policy=email.policy.default)
+            size = os.fstat( fp.fileno() ).st_size
+            if size >= self.mmap_threshold:
+                data = mmap.mmap( fp.fileno(), 0, access=mmap.ACCESS_READ )
+            else:
+                data = fp.read()
+        self.load_bytes( data )
+
+    def load_bytes(self, data ):
+        # the message is parsed on first use of self.message
+        self.raw = data
+        self._message = None
+        self._cid_index = None
+
+    @property
+    def message(self):
+        if self._message is None and self.raw is not None:
+            self._message = email.message_from_bytes( bytes(self.raw), policy=email.policy.default )
+        return self._message
     
     def _require_message(self):
         if self.message is None:
             raise RuntimeError( "No email message loaded" )
     
-    def find_part_by_cid(self, cid):
-        self._require_message()
+    def _build_cid_index(self):
+        index = {}
         for part in self.message.walk():
             h_cid = part.get("content-id")
             if h_cid is None:
                 continue
-            if ContentId.from_header_value( h_cid ) == cid:
-                return part
-        return None
+            try:
+                cid = ContentId.from_header_value( str(h_cid).strip() )
+            except ValueError:
+                continue
+            # the first part wins, like a search in walk order
+            index.setdefault( cid, part )
+        return index
+
+    def find_part_by_cid(self, cid):
+        self._require_message()
+        if self._cid_index is None:
+            self._cid_index = self._build_cid_index()
+        return self._cid_index.get( cid )
 
     def extract_vcard(self):
+        if self.fast_mime and self.raw is not None and self._message is None:
+            try:
+                vcard_data = FastBodyExtractor( self.body_preference ).extract( self.raw )
+                if vcard_data is not None:
+                    return vcard_data
+            except MimeScanError:
+                pass
+            # fall back to the full email parser
+
         self._require_message()
-        body = self.message.get_body( preferencelist=('vcard','plain') )
+        body = self.message.get_body( preferencelist=self.body_preference )
         return body.get_content()
-    
@@ -0,0 +1,105 @@
+import itertools
+import traceback
+import concurrent.futures
+
+class TaskResult( object ):
+
+    def __init__(self, item, value=None, error=None, error_traceback=None ):
+        self.item = item
+        self.value = value
+        # error message and formatted traceback, both None on success
+        self.error = error
+        self.error_traceback = error_traceback
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+def run_task( func, item ):
+    try:
+        return TaskResult( item, value=func( item ) )
+    except Exception as e:
+        return TaskResult( item, error=str(e), error_traceback=traceback.format_exc() )
+
+def _run_chunk( func, chunk ):
+    # executed in the worker process, chunk is a list of (sequence number, item)
+    return [ (seq, run_task( func, item )) for seq, item in chunk ]
+
+class ParallelExecutor( object ):
+
+    def __init__(self, jobs=1, chunk_size=16, max_pending=None ):
+        self.jobs = jobs
+        # number of items sent to a worker at once
+        self.chunk_size = max( 1, chunk_size )
+        # number of chunks in flight; at most max_pending * chunk_size items are
+        # submitted but not yet released, which bounds the reorder buffer when
+        # the oldest chunk is slow
+        if max_pending is None:
+            max_pending = self.jobs * 4
+        self.max_pending = max( 1, max_pending )
+
+    def map(self, func, items):
+        # yields a TaskResult for each item, in the order of items
+        # func must be picklable (module level function or method of a picklable object)
+        # items which already are a TaskResult are passed through without calling func
+        if self.jobs <= 1:
+            for item in items:
+                if isinstance( item, TaskResult ):
+                    yield item
+                else:
+                    yield run_task( func, item )
+            return
+
+        yield from self._map_pool( func, items )
+
+    def _map_pool(self, func, items):
+        numbered_items = enumerate( items )
+        pending = set()
+        reorder_buff = {}
+        next_seq = 0
+        # sequence number of the next item taken from items
+        submitted_seq = 0
+        max_window = self.max_pending * self.chunk_size
+        exhausted = False
+
+        def release():
+            # release results in submission order
+            nonlocal next_seq
+            while next_seq in reorder_buff:
+                yield reorder_buff.pop( next_seq )
+                next_seq += 1
+
+        pool = concurrent.futures.ProcessPoolExecutor( max_workers=self.jobs )
+        try:
+            while True:
+                while not exhausted and len(pending) < self.max_pending:
+                    # wait for the oldest results to be released before taking more items
+                    window = max_window - ( submitted_seq - next_seq )
+                    if window <= 0:
+                        break
+                    chunk = []
+                    item_count = 0
+                    for seq, item in itertools.islice( numbered_items, min( self.chunk_size, window ) ):
+                        submitted_seq = seq + 1
+                        item_count += 1
+                        if isinstance( item, TaskResult ):
+                            reorder_buff[ seq ] = item
+                        else:
+                            chunk.append( (seq, item) )
+                    if item_count == 0:
+                        exhausted = True
+                        break
+                    if chunk:
+                        pending.add( pool.submit( _run_chunk, func, chunk ) )
+                    yield from release()
+
+                if not pending:
+                    break
+
+                done, pending = concurrent.futures.wait( pending, return_when=concurrent.futures.FIRST_COMPLETED )
+                for future in done:
+                    for seq, result in future.result():
+                        reorder_buff[ seq ] = result
+                yield from release()
+        finally:
+            pool.shutdown( wait=True, cancel_futures=True )
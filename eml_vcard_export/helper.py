@@ -1,7 +1,13 @@
+import collections
+import itertools
 import os.path
+import queue
 import sys
+import threading
+import traceback
 
-import pandas as pd
+from .sources import is_archive, scan_archive
+from .executor import TaskResult
 
 class FileOutput( object ):
     def __init__(self, file_name, method ):
@@ -24,72 +30,189 @@ class FileOutput( object ):
 
 class FileIterator( object ):
     
-    def __init__(self, *base_paths, extensions=None, limit=None ):
+    def __init__(self, *base_paths, extensions=None, limit=None, file_lists=None, walkers=4, archives=False ):
         # base_path can be directory or single eml file
         self.base_paths = list(base_paths)
-        self.extensions = []
+        # files with NUL separated paths ("-" for stdin), as written by find -print0
+        self.file_lists = []
+        self.extensions = ()
         self.max_items = -1
+        # number of base paths walked ahead in background threads
+        self.walkers = max( 1, walkers )
+        # paths passed from a walker thread to the consumer at once
+        self.batch_size = 256
+        # yield the matching members of zip and tar archives as sources.MessageRef
+        self.archives = archives
 
         if extensions is not None:
-            self.extensions = extensions
+            self.extensions = tuple( '.' + ext for ext in extensions )
         if limit is not None:
             self.max_items = limit
+        if file_lists is not None:
+            self.file_lists = list(file_lists)
 
-        self.base_stack = []
-        self.file_stack = []
-        self.curr_iter = None
         self.item_count = 0
+        self.curr_iter = None
         self.reset()
 
     def reset(self):
-        self.base_stack = self.base_paths.copy()
-        self.file_stack = []
-        self.curr_iter = None
         self.item_count = 0
-    
-    def _mk_walk_iter(self, base_path):
-        if os.path.isfile( base_path ):
-            base_dir = os.path.dirname( base_path )
-            filename = os.path.basename( base_path )
-            walk_tuple = ( base_dir, (), (filename,) )
-            return iter( (walk_tuple,) )
-        elif os.path.isdir( base_path ):
-            return iter( os.walk( base_path ) )
-        return None
-    
-    def __iter__(self):
-        return self
+        self.curr_iter = self._iter_files()
 
-    def __next__(self):
-        if not self.base_stack and not self.file_stack:
-            raise StopIteration()
-        if self.max_items >= 0 and self.item_count >= self.max_items:
-            raise StopIteration()
-
-        if self.file_stack:
-            file = self.file_stack.pop()
-            ext = os.path.splitext( file )[1].lstrip('.')
-            if not self.extensions or ext in self.extensions:
-                self.item_count += 1
-                return file
-            else:
-                # recursion skipping this file
-                return self.__next__()
-        
-        if self.curr_iter is None:
-            self.curr_iter = self._mk_walk_iter( self.base_stack.pop() )
-        if self.curr_iter is None:
-            raise StopIteration()
-        
+    def _match(self, name):
+        return not self.extensions or name.endswith( self.extensions )
+
+    def _match_file(self, name):
+        return self._match( name ) or ( self.archives and is_archive( name ) )
+
+    def _walk(self, base_path):
+        # iterative depth first walk, entries in sorted order, files before sub directories
+        # DirEntry.is_file/is_dir use the file type from the directory listing, no stat per file
+        if not os.path.isdir( base_path ):
+            if os.path.isfile( base_path ) and self._match_file( os.path.basename( base_path ) ):
+                yield base_path
+            return
+
+        dir_stack = [ base_path ]
+        while dir_stack:
+            try:
+                with os.scandir( dir_stack.pop() ) as it:
+                    entries = sorted( it, key=lambda entry: entry.name )
+            except OSError:
+                # unreadable directory, skipped like os.walk does
+                continue
+            sub_dirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir( follow_symlinks=False ):
+                        sub_dirs.append( entry.path )
+                    elif self._match_file( entry.name ) and entry.is_file():
+                        yield entry.path
+                except OSError:
+                    continue
+            dir_stack.extend( reversed( sub_dirs ) )
+
+    def _read_file_list(self, list_path):
+        # listed paths are taken as files, no stat and no directory walk
+        if list_path == '-':
+            fh = sys.stdin.buffer
+        else:
+            fh = open( list_path, 'rb' )
+        try:
+            tail = b''
+            while True:
+                buff = fh.read( 65536 )
+                if not buff:
+                    break
+                names = ( tail + buff ).split( b'\0' )
+                tail = names.pop()
+                for name in names:
+                    path = os.fsdecode( name )
+                    if name and self._match_file( path ):
+                        yield path
+            path = os.fsdecode( tail.rstrip( b'\n' ) )
+            if path and self._match_file( path ):
+                yield path
+        finally:
+            if fh is not sys.stdin.buffer:
+                fh.close()
+
+    def _fill_queue(self, base_path, out_queue, stop):
+        # executed in a walker thread, puts lists of paths followed by None,
+        # or by the exception which ended the walk
+        def put( obj ):
+            while not stop.is_set():
+                try:
+                    out_queue.put( obj, timeout=0.1 )
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        end = None
         try:
-            (dirpath, dirnames, filenames) = self.curr_iter.__next__()
-            for name in filenames:
-                self.file_stack.append( os.path.join(dirpath, name) )
-        except StopIteration:
-            self.curr_iter = None
+            batch = []
+            for path in self._walk( base_path ):
+                batch.append( path )
+                if len(batch) >= self.batch_size:
+                    if not put( batch ):
+                        return
+                    batch = []
+            if batch:
+                put( batch )
+        except BaseException as e:
+            end = e
         finally:
-            # tail recursion until base_stack and file_stack are empty
-            # assuming here that we reached this code because file_stack was/is empty
-            return self.__next__()
+            put( end )
+
+    def _walk_ahead(self, base_paths):
+        # walks several base paths concurrently, the paths are still yielded in base path order
+        base_iter = iter( base_paths )
+        pending = collections.deque()
+        stop = threading.Event()
+
+        def start_next():
+            base_path = next( base_iter, None )
+            if base_path is None:
+                return
+            out_queue = queue.Queue( maxsize=16 )
+            thread = threading.Thread( target=self._fill_queue, args=(base_path, out_queue, stop), daemon=True )
+            thread.start()
+            pending.append( (base_path, thread, out_queue) )
+
+        for i in range( self.walkers ):
+            start_next()
+        try:
+            while pending:
+                base_path, thread, out_queue = pending[0]
+                while True:
+                    try:
+                        batch = out_queue.get( timeout=1.0 )
+                    except queue.Empty:
+                        # the walker always ends with None or an exception, unless it was killed
+                        if not thread.is_alive() and out_queue.empty():
+                            raise RuntimeError( "walker thread of {} ended without a result".format( base_path ) )
+                        continue
+                    if batch is None:
+                        break
+                    if isinstance( batch, BaseException ):
+                        raise batch
+                    yield from batch
+                pending.popleft()
+                start_next()
+        finally:
+            stop.set()
+            for base_path, thread, out_queue in pending:
+                thread.join()
+
+    def _scan_archive(self, archive_path):
+        # a corrupt or truncated archive is reported like a message which failed to
+        # parse, by a failed TaskResult, see ExportApp.iter_processed
+        try:
+            yield from scan_archive( archive_path, self._match )
+        except Exception as e:
+            yield TaskResult( archive_path, error=str(e), error_traceback=traceback.format_exc() )
+
+    def _iter_files(self):
+        if self.walkers > 1 and len(self.base_paths) > 1:
+            walk_iter = self._walk_ahead( self.base_paths )
+        else:
+            walk_iter = itertools.chain.from_iterable( map( self._walk, self.base_paths ) )
+        list_iter = itertools.chain.from_iterable( map( self._read_file_list, self.file_lists ) )
 
+        for path in itertools.chain( walk_iter, list_iter ):
+            if self.archives and is_archive( path ):
+                items = self._scan_archive( path )
+            else:
+                items = ( path, )
+            for item in items:
+                if self.max_items >= 0 and self.item_count >= self.max_items:
+                    return
+                self.item_count += 1
+                yield item
 
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next( self.curr_iter )
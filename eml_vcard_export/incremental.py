@@ -0,0 +1,155 @@
+import os
+import os.path
+import hashlib
+import json
+import sqlite3
+import traceback
+
+from .executor import TaskResult
+
+def data_digest( data ):
+    # same digest as file_digest, of bytes already in memory
+    return hashlib.blake2b( data, digest_size=20 ).hexdigest()
+
+def file_digest( file_path, block_size=1<<20 ):
+    h = hashlib.blake2b( digest_size=20 )
+    with open( file_path, 'rb' ) as fp:
+        while True:
+            block = fp.read( block_size )
+            if not block:
+                break
+            h.update( block )
+    return h.hexdigest()
+
+class IncrementalTask( object ):
+    # a file whose cached record could not be reused based on mtime and size
+
+    def __init__(self, file_path, mtime_ns, size, digest=None):
+        self.file_path = file_path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # digest of the cached record, None if there is none
+        self.digest = digest
+        # the file content, if it was read ahead by the Prefetcher
+        self.data = None
+    
+    def __str__(self):
+        return self.file_path
+
+class IncrementalResult( object ):
+    # returned by the worker, the record is only set if the content changed
+    # the record of a card not selected by --where is None
+
+    def __init__(self, digest, record=None, unchanged=False):
+        self.digest = digest
+        self.record = record
+        self.unchanged = unchanged
+
+class IncrementalState( object ):
+    # persistent manifest: file fingerprint (path, mtime, size, hash) => serialized record
+    # Records are committed every commit_interval updates, so an interrupted run
+    # can be resumed: already processed files are found in the manifest.
+
+    def __init__(self, state_path, options, commit_interval=500):
+        self.commit_interval = commit_interval
+        self.conn = sqlite3.connect( state_path )
+        self.conn.execute( "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)" )
+        self.conn.execute( "CREATE TABLE IF NOT EXISTS records (path TEXT PRIMARY KEY, "
+                           "mtime_ns INTEGER, size INTEGER, digest TEXT, record TEXT, run INTEGER)" )
+
+        # records produced with other output options are useless
+        options = json.dumps( options, sort_keys=True )
+        if self._get_meta( 'options' ) != options:
+            self.conn.execute( "DELETE FROM records" )
+            self._set_meta( 'options', options )
+
+        self.run = int( self._get_meta( 'run' ) or 0 ) + 1
+        self._set_meta( 'run', str(self.run) )
+        self.conn.commit()
+
+        self.uncommitted = 0
+        self.seen_buff = []
+        self.cached_count = 0
+        self.updated_count = 0
+
+    def _get_meta(self, key):
+        row = self.conn.execute( "SELECT value FROM meta WHERE key=?", (key,) ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def _set_meta(self, key, value):
+        self.conn.execute( "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value) )
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath( file_path )
+
+    def _get_record(self, file_path):
+        row = self.conn.execute( "SELECT record FROM records WHERE path=?", (self._key(file_path),) ).fetchone()
+        return json.loads( row[0] )
+
+    def _count_update(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        if self.seen_buff:
+            self.conn.executemany( "UPDATE records SET run=? WHERE path=?", self.seen_buff )
+            self.seen_buff = []
+        self.conn.commit()
+        self.uncommitted = 0
+
+    def plan(self, file_paths):
+        # yields a TaskResult with the cached record for unchanged files,
+        # otherwise an IncrementalTask
+        for file_path in file_paths:
+            if not isinstance( file_path, str ):
+                # messages in containers, see sources.MessageRef, are passed through
+                yield file_path
+                continue
+            key = self._key( file_path )
+            try:
+                st = os.stat( file_path )
+            except OSError as e:
+                # vanished or unreadable since the walk, reported like a failed file
+                yield TaskResult( file_path, error=str(e), error_traceback=traceback.format_exc() )
+                continue
+            row = self.conn.execute( "SELECT mtime_ns, size, digest, record FROM records WHERE path=?", (key,) ).fetchone()
+
+            if row is not None and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+                self.cached_count += 1
+                self.seen_buff.append( (self.run, key) )
+                self._count_update()
+                yield TaskResult( file_path, value=json.loads( row[3] ) )
+                continue
+
+            digest = None
+            if row is not None:
+                digest = row[2]
+            yield IncrementalTask( file_path, st.st_mtime_ns, st.st_size, digest=digest )
+
+    def update(self, task, result):
+        # stores the IncrementalResult of task, returns the record
+        record = result.record
+        if result.unchanged:
+            # same content, only the mtime changed
+            record = self._get_record( task.file_path )
+            self.cached_count += 1
+        else:
+            self.updated_count += 1
+
+        self.conn.execute( "INSERT OR REPLACE INTO records (path, mtime_ns, size, digest, record, run) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", 
+                           (self._key(task.file_path), task.mtime_ns, task.size, result.digest, json.dumps(record), self.run) )
+        self._count_update()
+        return record
+
+    def close(self, prune=False):
+        # prune: drop the records of files not seen in this run
+        self.commit()
+        if prune:
+            self.conn.execute( "DELETE FROM records WHERE run!=?", (self.run,) )
+            self.conn.commit()
+        self.conn.close()
@@ -1,20 +1,23 @@
 import json
 import sys
 
-from .vcard import vAttribute
 from .vcard.attributes import *
+from .vcard.attributes.dispatch import AttributeDispatcher
 
 
 class JsonExportStrategy( object ):
     def __init__(self):
-        pass
+        # optional BlobStore, binary payloads are replaced by a reference into it
+        self.blob_store = None
 
 class DefaultJsonExportStrategy( JsonExportStrategy ):
     
     def __init__(self):
         super().__init__()
         
-        self.attr_handlers = [
+        # handlers are called with (attr, data dict)
+        self.attr_handlers = AttributeDispatcher( default=self._handle_unknown_attr )
+        self.attr_handlers.register_all( [
             ( vFnAttribute,        self._handle_text_attr ),
             ( vNameAttribute,      self._handle_attr_name ),
             ( vNicknameAttribute,  self._handle_attr_nickname ),
@@ -47,7 +50,7 @@ class DefaultJsonExportStrategy( JsonExportStrategy ):
             ( vProfileAttribute,   self._handle_text_attr ),
 
             ( vImppAttribute,      self._handle_text_attr ),
-        ]
+        ] )
     
     def vcard_to_native(self, vcard ):
         vcard_data = []
@@ -84,15 +87,13 @@ class DefaultJsonExportStrategy( JsonExportStrategy ):
         return data
     
     def _handle_attr(self, attr, data):
-        for handler in self.attr_handlers:
-            if isinstance( attr, handler[0] ):
-                return handler[1]( attr, data )
+        return self.attr_handlers( attr, data )
 
-        if isinstance( attr, vAttribute ):
-            # unknown value type
-            data[ "type" ] = "vcard-original-value"
-            data[ "value" ] = str( attr.original_value )
-            return data
+    def _handle_unknown_attr(self, attr, data):
+        # unknown value type
+        data[ "type" ] = "vcard-original-value"
+        data[ "value" ] = str( attr.original_value )
+        return data
 
     def _get_value(self, attr, name ):
         return str( getattr( attr, name ) )
@@ -160,7 +161,13 @@ class DefaultJsonExportStrategy( JsonExportStrategy ):
         if attr.has_uri:
             data[ "type" ] = "uri"
             data[ "value" ] = self._get_value( attr, "uri" )
+        elif self.blob_store is not None:
+            blob = self.blob_store.store( attr.data.data )
+            data[ "type" ] = "blob"
+            data[ "value" ] = blob.uri
+            data[ "hash" ] = blob.hash_ref
+            data[ "size" ] = blob.size
         else:
             data[ "type" ] = "bin-b64"
-            data[ "value" ] = attr.uri.to_base64()
+            data[ "value" ] = attr.data.to_base64()
         return data
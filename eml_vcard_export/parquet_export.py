@@ -0,0 +1,267 @@
+import datetime
+import pickle
+import re
+import sys
+import tempfile
+
+# pyarrow is only needed by the parquet_export subcommand
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from .csv_export import is_na
+
+_DATE_RE = re.compile( r'(\d{4})-?(\d{2})-?(\d{2})' )
+_DATE_TIME_RE = re.compile( r'(\d{4})-?(\d{2})-?(\d{2})(?:T(\d{2}):?(\d{2}):?(\d{2})(?:[.,]\d+)?(Z|[+-]\d{2}(?::?\d{2})?)?)?$' )
+
+def parse_date( value ):
+    # RFC2426 date-value, the date of a date-time-value
+    m = _DATE_RE.match( str(value).strip() )
+    if m is None:
+        raise ValueError( "not a date: {}".format( value ) )
+    return datetime.date( *( int(v) for v in m.groups() ) )
+
+def parse_timestamp( value ):
+    # RFC2426 date-time-value or date-value, a time without zone is taken as UTC
+    m = _DATE_TIME_RE.match( str(value).strip() )
+    if m is None:
+        raise ValueError( "not a date-time: {}".format( value ) )
+    year, month, day, hour, minute, second, zone = m.groups()
+    tz = datetime.timezone.utc
+    if zone is not None and zone != 'Z':
+        digits = zone[1:].replace( ':', '' )
+        offset = datetime.timedelta( hours=int( digits[:2] ), minutes=int( digits[2:] or 0 ) )
+        tz = datetime.timezone( -offset if zone[0] == '-' else offset )
+    dt = datetime.datetime( int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0), tzinfo=tz )
+    return dt.astimezone( datetime.timezone.utc )
+
+# columns of FullCsvExportStrategy with a known type: (name regex, arrow type, converter)
+# the arrow types are built on use, pyarrow is optional
+TYPED_COLUMNS = (
+    ( re.compile( r'BDAY_\d+_VALUE$' ),    lambda: pa.date32(),                    parse_date ),
+    ( re.compile( r'REV_\d+_VALUE$' ),     lambda: pa.timestamp( 's', tz='UTC' ),  parse_timestamp ),
+    ( re.compile( r'GEO_\d+_(LAT|LON)$' ), lambda: pa.float64(),                   float ),
+    ( re.compile( r'FILE_OFFSET$' ),       lambda: pa.int64(),                     int ),
+)
+
+def typed_column( name ):
+    # (arrow type, converter) of a column in TYPED_COLUMNS, or None
+    for name_re, mk_type, convert in TYPED_COLUMNS:
+        if name_re.match( name ) is not None:
+            return mk_type(), convert
+    return None
+
+class ParquetGroupWriter( object ):
+    # builds the record batch of a row group, values of typed columns are converted,
+    # values which can not be converted are written as null and counted
+
+    def __init__(self, row_group_size=10000):
+        self.row_group_size = max( 1, row_group_size )
+        self.row_count = 0
+        self.group_count = 0
+        # column name => count of values which could not be converted
+        self.conversion_errors = {}
+
+    def _convert(self, name, convert, value):
+        try:
+            return convert( value )
+        except ValueError:
+            self.conversion_errors[ name ] = self.conversion_errors.get( name, 0 ) + 1
+            return None
+
+    def _mk_batch(self, schema, group_rows, group):
+        # group: column name => (row numbers, values)
+        arrays = []
+        for field in schema:
+            values = [ None ] * group_rows
+            column = group.get( field.name )
+            if column is not None:
+                for row_num, value in zip( *column ):
+                    values[ row_num ] = value
+            typed = typed_column( field.name )
+            if typed is not None:
+                values = [ v if v is None else self._convert( field.name, typed[1], v ) for v in values ]
+            elif pa.types.is_string( field.type ):
+                values = [ v if v is None or isinstance( v, str ) else str(v) for v in values ]
+            arrays.append( pa.array( values, type=field.type ) )
+        self.group_count += 1
+        return pa.RecordBatch.from_arrays( arrays, schema=schema )
+
+    def info_lines(self):
+        lines = [ "rows: {}, row groups: {}".format( self.row_count, self.group_count ) ]
+        for name, count in self.conversion_errors.items():
+            lines.append( "Warning: {} values of {} could not be converted, written as null".format( count, name ) )
+        return lines
+
+class ParquetTable( ParquetGroupWriter ):
+    # Takes the rows of FullCsvExportStrategy and writes them as parquet file,
+    # one row group per row_group_size rows.
+    # Without a column list, the columns of a row group are only known when all rows
+    # have been seen (the schema is the union of all columns which have a value), so
+    # full row groups are spooled to a temporary file and written out by write_file.
+    # Memory use is bounded by one row group. See ParquetStreamWriter for a known
+    # column list.
+
+    def __init__(self, row_group_size=10000, spool_dir=None):
+        super().__init__( row_group_size )
+        # column name => count of values which are not NA, in order of appearance
+        self.value_counts = {}
+        # column name => set of python types of the values
+        self.value_types = {}
+
+        # the current row group: column name => (row numbers, values)
+        self.group = {}
+        self.group_rows = 0
+        self.spool = tempfile.TemporaryFile( dir=spool_dir )
+        self.spooled_groups = 0
+
+    def append_row(self, row):
+        # row is a dict column name => scalar value
+        row_num = self.group_rows
+        for name, value in row.items():
+            column = self.group.get( name )
+            if column is None:
+                column = ( [], [] )
+                self.group[ name ] = column
+                self.value_counts.setdefault( name, 0 )
+            if is_na( value ):
+                continue
+            column[0].append( row_num )
+            column[1].append( value )
+            self.value_counts[ name ] += 1
+            self.value_types.setdefault( name, set() ).add( type(value) )
+
+        self.group_rows += 1
+        self.row_count += 1
+        if self.group_rows >= self.row_group_size:
+            self._spool_group()
+
+    def _spool_group(self):
+        if self.group_rows == 0:
+            return
+        pickle.dump( (self.group_rows, self.group), self.spool, protocol=pickle.HIGHEST_PROTOCOL )
+        self.spooled_groups += 1
+        self.group = {}
+        self.group_rows = 0
+
+    def _iter_groups(self):
+        self.spool.seek( 0 )
+        for i in range( self.spooled_groups ):
+            yield pickle.load( self.spool )
+
+    def column_type(self, name):
+        typed = typed_column( name )
+        if typed is not None:
+            return typed[0]
+        types = self.value_types.get( name, set() )
+        if types == { bool }:
+            return pa.bool_()
+        if types and types <= { int }:
+            return pa.int64()
+        if types and types <= { int, float }:
+            return pa.float64()
+        return pa.string()
+
+    @property
+    def column_names(self):
+        # all NA columns are pruned from the schema
+        return [ name for name, count in self.value_counts.items() if count > 0 ]
+
+    def schema(self):
+        return pa.schema( [ ( name, self.column_type( name ) ) for name in self.column_names ] )
+
+    def write_file(self, file_path=None, compression='snappy'):
+        if pa is None:
+            raise ImportError( "parquet_export requires the pyarrow package" )
+        self._spool_group()
+        schema = self.schema()
+
+        out = file_path
+        if file_path is None:
+            out = sys.stdout.buffer
+        with pq.ParquetWriter( out, schema, compression=compression ) as writer:
+            for group_rows, group in self._iter_groups():
+                writer.write_batch( self._mk_batch( schema, group_rows, group ) )
+        self.spool.close()
+
+    def info(self):
+        lines = self.info_lines()
+        for name in self.column_names:
+            lines.append( "  {:<30} {:>8} non-null  {}".format( name, self.value_counts[ name ], self.column_type( name ) ) )
+        return "\n".join( lines )
+
+class ParquetStreamWriter( ParquetGroupWriter ):
+    # writes rows with a fixed column list as they arrive, one row group per
+    # row_group_size rows, like csv_export.CsvStreamWriter
+    # Columns in TYPED_COLUMNS get their type, all others are strings. On close the
+    # file is finished with the row groups written so far, also after an error.
+
+    def __init__(self, file_path, columns, row_group_size=10000, compression='snappy'):
+        if pa is None:
+            raise ImportError( "parquet_export requires the pyarrow package" )
+        super().__init__( row_group_size )
+        self.columns = list( columns )
+        self.column_set = set( self.columns )
+        fields = []
+        for name in self.columns:
+            typed = typed_column( name )
+            fields.append( ( name, pa.string() if typed is None else typed[0] ) )
+        self.schema = pa.schema( fields )
+        # columns with values which are not in self.columns
+        self.dropped_columns = set()
+
+        out = file_path
+        if file_path is None:
+            out = sys.stdout.buffer
+        self.writer = pq.ParquetWriter( out, self.schema, compression=compression )
+        self.group = {}
+        self.group_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def append_row(self, row):
+        # row is a dict column name => scalar value
+        row_num = self.group_rows
+        for name, value in row.items():
+            if is_na( value ):
+                continue
+            if name not in self.column_set:
+                self.dropped_columns.add( name )
+                continue
+            column = self.group.get( name )
+            if column is None:
+                column = ( [], [] )
+                self.group[ name ] = column
+            column[0].append( row_num )
+            column[1].append( value )
+
+        self.group_rows += 1
+        self.row_count += 1
+        if self.group_rows >= self.row_group_size:
+            self._write_group()
+
+    def _write_group(self):
+        if self.group_rows == 0:
+            return
+        self.writer.write_batch( self._mk_batch( self.schema, self.group_rows, self.group ) )
+        self.group = {}
+        self.group_rows = 0
+
+    def close(self):
+        if self.writer is None:
+            return
+        try:
+            self._write_group()
+        finally:
+            self.writer.close()
+            self.writer = None
+
+    def info(self):
+        return "\n".join( self.info_lines() + [ "columns: {}".format( len(self.columns) ) ] )
@@ -0,0 +1,85 @@
+import collections
+import concurrent.futures
+
+from .sources import MessageRef, TarMemberRef, source_fields
+from .incremental import IncrementalTask
+
+class PrefetchedRef( MessageRef ):
+    # the bytes of a file path or MessageRef, read ahead by the Prefetcher
+
+    def __init__(self, item, data):
+        self.item = item
+        self.data = data
+
+    def read(self):
+        return self.data
+
+    def source_fields(self):
+        return source_fields( self.item )
+
+    def __str__(self):
+        return str( self.item )
+
+def read_source( item ):
+    if isinstance( item, IncrementalTask ):
+        item = item.file_path
+    if isinstance( item, str ):
+        with open( item, 'rb' ) as fh:
+            return fh.read()
+    return item.read()
+
+class Prefetcher( object ):
+    # Reads the messages ahead of the consumer, so the latency of open and read
+    # (network file systems) overlaps with parsing. The reads run on a pool of depth
+    # threads, at most depth reads are in flight and at most depth buffers wait for
+    # the consumer. File reads block in any case (there is no asynchronous file
+    # I/O in asyncio), so the pool is used directly instead of an event loop.
+
+    def __init__(self, depth=8):
+        self.depth = max( 1, depth )
+
+    @staticmethod
+    def wants( item ):
+        # file paths and messages not yet in memory, everything else is passed through
+        if isinstance( item, (str, IncrementalTask) ):
+            return True
+        return isinstance( item, MessageRef ) and not isinstance( item, (TarMemberRef, PrefetchedRef) )
+
+    def iter(self, items):
+        # yields the items in order, file paths and MessageRef replaced by a PrefetchedRef,
+        # IncrementalTask with its data set; items is consumed in the calling thread
+        read_pool = concurrent.futures.ThreadPoolExecutor( max_workers=self.depth )
+
+        # (item, concurrent future or None), bounded by depth
+        pending = collections.deque()
+
+        def pop():
+            item, future = pending.popleft()
+            if future is None:
+                return item
+            try:
+                data = future.result()
+                if isinstance( item, IncrementalTask ):
+                    # stays an IncrementalTask for IncrementalState.update
+                    item.data = data
+                    return item
+                return PrefetchedRef( item, data )
+            except Exception:
+                # the worker reads the item again and reports the error
+                return item
+
+        try:
+            for item in items:
+                future = None
+                if self.wants( item ):
+                    future = read_pool.submit( read_source, item )
+                pending.append( (item, future) )
+                if len(pending) >= self.depth:
+                    yield pop()
+            while pending:
+                yield pop()
+        finally:
+            for item, future in pending:
+                if future is not None:
+                    future.cancel()
+            read_pool.shutdown( wait=True )
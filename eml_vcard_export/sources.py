@@ -0,0 +1,205 @@
+import mmap
+import os
+import os.path
+import re
+import tarfile
+import threading
+import zipfile
+
+# message containers besides loose eml files
+# Messages inside a container are referenced by a MessageRef, which only holds
+# the location, so it is cheap to pickle and send to the worker processes.
+
+MBOX_FROM = b'From '
+MBOX_SEPARATOR = b'\nFrom '
+# mboxrd quoting: ">From " in the body was written as ">>From "
+# mboxo and mboxcl quote "From " as ">From " without a way to tell it from a
+# literal ">From ", those are left as they are
+MBOX_VARIANTS = ( 'mboxo', 'mboxrd' )
+MBOX_QUOTED_FROM_RE = re.compile( rb'^>(>*From )', re.MULTILINE )
+
+ZIP_EXTENSIONS = ( '.zip', )
+TAR_EXTENSIONS = ( '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz' )
+
+class MessageRef( object ):
+    # a message stored at offset in the container file
+
+    def __init__(self, container, offset, length):
+        self.container = container
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        # reopens the container, returns the message bytes
+        with open( self.container, 'rb' ) as fh:
+            fh.seek( self.offset )
+            return fh.read( self.length )
+
+    def source_fields(self):
+        return { 'file': self.container, 'offset': self.offset }
+
+    def __str__(self):
+        return "{}:{}".format( self.container, self.offset )
+
+class MboxMessageRef( MessageRef ):
+    # offset points to the "From " line, which is not part of the message
+
+    def __init__(self, container, offset, length, unquote_from=False):
+        super().__init__( container, offset, length )
+        # undo the mboxrd quoting of "From " lines
+        self.unquote_from = unquote_from
+
+    def read(self):
+        data = super().read()
+        data = data[ data.find( b'\n' )+1: ]
+        if self.unquote_from:
+            data = MBOX_QUOTED_FROM_RE.sub( rb'\1', data )
+        return data
+
+class ZipMemberRef( MessageRef ):
+    # a member of a zip archive, read with random access in the worker
+
+    # the last opened archive of each thread, saves reading the central directory per member
+    # per thread, since the Prefetcher reads members on several threads
+    _local = threading.local()
+
+    def __init__(self, container, member):
+        self.container = container
+        self.member = member
+
+    @classmethod
+    def _get_archive(cls, container):
+        path, archive = getattr( cls._local, 'open_archive', ( None, None ) )
+        if path != container:
+            if archive is not None:
+                archive.close()
+            archive = zipfile.ZipFile( container )
+            cls._local.open_archive = ( container, archive )
+        return archive
+
+    def read(self):
+        return self._get_archive( self.container ).read( self.member )
+
+    def source_fields(self):
+        return { 'file': self.container, 'member': self.member }
+
+    def __str__(self):
+        return "{}:{}".format( self.container, self.member )
+
+class TarMemberRef( ZipMemberRef ):
+    # a member of a (compressed) tar archive, which can only be read sequentially:
+    # the bytes are read while scanning the archive and travel with the reference
+
+    def __init__(self, container, member, data):
+        super().__init__( container, member )
+        self.data = data
+
+    def read(self):
+        return self.data
+
+def is_archive( path ):
+    return path.endswith( ZIP_EXTENSIONS ) or path.endswith( TAR_EXTENSIONS )
+
+def scan_archive( archive_path, match=None ):
+    # yields a reference for each regular file member whose name passes match
+    if archive_path.endswith( ZIP_EXTENSIONS ):
+        with zipfile.ZipFile( archive_path ) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and ( match is None or match( info.filename ) ):
+                    yield ZipMemberRef( archive_path, info.filename )
+        return
+
+    # stream mode, members are decompressed once in archive order
+    with tarfile.open( archive_path, 'r|*' ) as archive:
+        for info in archive:
+            if info.isfile() and ( match is None or match( info.name ) ):
+                data = archive.extractfile( info ).read()
+                yield TarMemberRef( archive_path, info.name, data )
+
+def source_fields( item ):
+    # identifies the input of a record, item is a file path or a MessageRef
+    if isinstance( item, MessageRef ):
+        return item.source_fields()
+    return { 'file': item }
+
+class MboxReader( object ):
+    # yields a MboxMessageRef for each message in the mbox files
+
+    def __init__(self, mbox_paths, variant='mboxo'):
+        self.mbox_paths = mbox_paths
+        # one of MBOX_VARIANTS
+        self.variant = variant
+
+    def __iter__(self):
+        for mbox_path in self.mbox_paths:
+            yield from self.scan( mbox_path, unquote_from=self.variant == 'mboxrd' )
+
+    @staticmethod
+    def scan( mbox_path, unquote_from=False ):
+        with open( mbox_path, 'rb' ) as fh:
+            if os.fstat( fh.fileno() ).st_size == 0:
+                return
+            # the separators are searched in the mapping, messages are not copied
+            with mmap.mmap( fh.fileno(), 0, access=mmap.ACCESS_READ ) as mm:
+                if mm[ :len(MBOX_FROM) ] == MBOX_FROM:
+                    start = 0
+                else:
+                    # garbage before the first message
+                    start = mm.find( MBOX_SEPARATOR )
+                    if start < 0:
+                        return
+                    start += 1
+
+                size = len(mm)
+                while start < size:
+                    sep = mm.find( MBOX_SEPARATOR, start )
+                    if sep < 0:
+                        end = size
+                    else:
+                        end = sep + 1
+                    # the empty line before the next "From " line belongs to the separator
+                    length = end - start
+                    if mm[ end-4:end ] == b'\r\n\r\n':
+                        length -= 2
+                    elif mm[ end-2:end ] == b'\n\n':
+                        length -= 1
+                    yield MboxMessageRef( mbox_path, start, length, unquote_from=unquote_from )
+                    start = end
+
+class MaildirReader( object ):
+    # yields the message file paths of Maildir directories, including Maildir++ sub folders
+
+    maildir_subdirs = ( 'cur', 'new' )
+
+    def __init__(self, maildir_paths):
+        self.maildir_paths = maildir_paths
+
+    def __iter__(self):
+        for maildir_path in self.maildir_paths:
+            for folder in self.iter_folders( maildir_path ):
+                yield from self.scan_folder( folder )
+
+    def iter_folders(self, maildir_path):
+        yield maildir_path
+        try:
+            with os.scandir( maildir_path ) as it:
+                names = sorted( entry.name for entry in it
+                                if entry.name.startswith('.') and entry.is_dir() )
+        except OSError:
+            return
+        for name in names:
+            folder = os.path.join( maildir_path, name )
+            if os.path.isdir( os.path.join( folder, 'cur' ) ):
+                yield folder
+
+    def scan_folder(self, folder):
+        for subdir in self.maildir_subdirs:
+            try:
+                with os.scandir( os.path.join( folder, subdir ) ) as it:
+                    entries = sorted( it, key=lambda entry: entry.name )
+            except OSError:
+                continue
+            for entry in entries:
+                # dot files are temporary files of some delivery agents
+                if not entry.name.startswith('.') and entry.is_file():
+                    yield entry.path
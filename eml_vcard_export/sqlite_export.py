@@ -0,0 +1,170 @@
+import base64
+import sqlite3
+
+from .blob_store import BlobStore
+from .vcard.attributes import *
+from .vcard.attributes.dispatch import AttributeDispatcher
+
+SCHEMA = (
+    "CREATE TABLE cards (id INTEGER PRIMARY KEY, source_file TEXT, source_offset INTEGER, source_member TEXT)",
+    # value_type: text, text-list, text-struct, binary, original
+    "CREATE TABLE attributes (id INTEGER PRIMARY KEY, card_id INTEGER, position INTEGER, "
+    "grp TEXT, name TEXT, value_type TEXT, original_value TEXT)",
+    "CREATE TABLE params (attribute_id INTEGER, position INTEGER, name TEXT, value TEXT)",
+    # component: the decoded class attribute, e.g. email, family_names, divisions
+    "CREATE TABLE \"values\" (attribute_id INTEGER, component TEXT, position INTEGER, value TEXT)",
+    # binary values: a uri (external or --blob-dir) and/or the digest of the payload in blobs
+    "CREATE TABLE binaries (attribute_id INTEGER, uri TEXT, digest TEXT, size INTEGER)",
+    "CREATE TABLE blobs (digest TEXT PRIMARY KEY, data BLOB)",
+)
+
+# built after the bulk load, cheaper than maintaining them on every insert
+INDEXES = (
+    "CREATE INDEX attributes_card ON attributes (card_id)",
+    "CREATE INDEX attributes_name ON attributes (name)",
+    "CREATE INDEX params_attribute ON params (attribute_id)",
+    "CREATE INDEX values_attribute ON \"values\" (attribute_id)",
+    "CREATE INDEX values_name ON \"values\" (value) WHERE component IN ('fn', 'family_names', 'given_names')",
+    "CREATE INDEX values_email ON \"values\" (value) WHERE component='email'",
+    "CREATE INDEX values_tel ON \"values\" (value) WHERE component='tel'",
+    "CREATE INDEX binaries_attribute ON binaries (attribute_id)",
+)
+
+SOURCE_COLUMNS = ( 'file', 'offset', 'member' )
+
+class SqliteExportStrategy( object ):
+    # converts a vCard to a json serializable record of table rows, executed in the workers
+    # the attribute class picks the value rows, see AttributeDispatcher
+
+    def __init__(self):
+        # optional BlobStore, binary payloads are replaced by a reference into it
+        self.blob_store = None
+
+        # handlers are called with (attr), return (value_type, value rows, binary)
+        self.attr_handlers = AttributeDispatcher( default=self._handle_unknown_attr )
+        self.attr_handlers.register_all( [
+            ( vAbstractTextAttr,       self._handle_text_attr ),
+            ( vAbstractTextListAttr,   self._handle_text_list_attr ),
+            ( vAbstractStructTextAttr, self._handle_struct_attr ),
+            ( vOrgAttribute,           self._handle_org_attr ),
+            ( vAbstractBinaryUriAttr,  self._handle_binuri_attr ),
+        ] )
+
+    def vcard_to_record(self, vcard):
+        attrs = []
+        for attr in vcard.attrs:
+            name = str(attr.name).lower()
+            if name in ("begin","end"):
+                continue
+            params = [ [ str(p.name).lower(), [ str(v) for v in p.values ] ] for p in attr.params ]
+            value_type, values, binary = self.attr_handlers( attr )
+            original_value = None
+            if value_type == 'original':
+                original_value = str( attr.original_value )
+            attrs.append( [ str(attr.group), name, value_type, original_value, params, values, binary ] )
+        return attrs
+
+    def _handle_unknown_attr(self, attr):
+        return 'original', [], None
+
+    def _handle_text_attr(self, attr):
+        name = attr._value_class_attr_name
+        return 'text', [ [ name, 0, str( getattr( attr, name ) ) ] ], None
+
+    def _handle_text_list_attr(self, attr):
+        name = attr._value_class_attr_name
+        return 'text-list', [ [ name, i, str(v) ] for i, v in enumerate( getattr( attr, name ) ) ], None
+
+    def _handle_struct_attr(self, attr):
+        values = []
+        for name in attr._component_order:
+            values.extend( [ name, i, str(v) ] for i, v in enumerate( getattr( attr, name ) ) )
+        return 'text-struct', values, None
+
+    def _handle_org_attr(self, attr):
+        values = [ [ 'organization', 0, str( attr.organization ) ] ]
+        values.extend( [ 'divisions', i, str(v) ] for i, v in enumerate( attr.divisions ) )
+        return 'text-struct', values, None
+
+    def _handle_binuri_attr(self, attr):
+        if attr.has_uri:
+            return 'binary', [], { 'uri': str( attr.uri ) }
+        data = attr.data.data
+        if self.blob_store is not None:
+            blob = self.blob_store.store( data )
+            return 'binary', [], { 'uri': blob.uri, 'digest': blob.digest, 'size': blob.size }
+        # base64, the records must be json serializable for --incremental
+        return 'binary', [], { 'digest': BlobStore.digest( data ), 'size': len(data),
+                               'data': base64.b64encode( data ).decode( 'ascii' ) }
+
+class SqliteSink( object ):
+    # writes the records of SqliteExportStrategy, in transactions of batch_size cards
+
+    def __init__(self, db_path, batch_size=1000):
+        self.batch_size = max( 1, batch_size )
+        self.conn = sqlite3.connect( db_path )
+        self.conn.execute( "PRAGMA journal_mode=WAL" )
+        self.conn.execute( "PRAGMA synchronous=NORMAL" )
+        # the export replaces the tables of a previous run
+        for table in ( 'cards', 'attributes', 'params', 'values', 'binaries', 'blobs' ):
+            self.conn.execute( "DROP TABLE IF EXISTS \"{}\"".format( table ) )
+        for statement in SCHEMA:
+            self.conn.execute( statement )
+        self.conn.commit()
+
+        # the ids are assigned here, so all tables can be filled with executemany
+        self.card_id = 0
+        self.attribute_id = 0
+        self.card_count = 0
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        self.cards = []
+        self.attributes = []
+        self.params = []
+        self.values = []
+        self.binaries = []
+        self.blobs = []
+
+    def add(self, source, record):
+        # source: dict from sources.source_fields
+        self.card_id += 1
+        self.cards.append( (self.card_id,) + tuple( source.get( c ) for c in SOURCE_COLUMNS ) )
+        for position, (group, name, value_type, original_value, params, values, binary) in enumerate( record ):
+            self.attribute_id += 1
+            attr_id = self.attribute_id
+            self.attributes.append( (attr_id, self.card_id, position, group, name, value_type, original_value) )
+            param_pos = 0
+            for param_name, param_values in params:
+                for param_value in param_values:
+                    self.params.append( (attr_id, param_pos, param_name, param_value) )
+                    param_pos += 1
+            for component, value_pos, value in values:
+                self.values.append( (attr_id, component, value_pos, value) )
+            if binary is not None:
+                self.binaries.append( (attr_id, binary.get('uri'), binary.get('digest'), binary.get('size')) )
+                if binary.get('data') is not None:
+                    self.blobs.append( (binary['digest'], base64.b64decode( binary['data'] )) )
+
+        self.card_count += 1
+        if len(self.cards) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self.conn:
+            self.conn.executemany( "INSERT INTO cards VALUES (?, ?, ?, ?)", self.cards )
+            self.conn.executemany( "INSERT INTO attributes VALUES (?, ?, ?, ?, ?, ?, ?)", self.attributes )
+            self.conn.executemany( "INSERT INTO params VALUES (?, ?, ?, ?)", self.params )
+            self.conn.executemany( "INSERT INTO \"values\" VALUES (?, ?, ?, ?)", self.values )
+            self.conn.executemany( "INSERT INTO binaries VALUES (?, ?, ?, ?)", self.binaries )
+            # the same payload is stored once
+            self.conn.executemany( "INSERT OR IGNORE INTO blobs VALUES (?, ?)", self.blobs )
+        self._reset_buffers()
+
+    def close(self):
+        self.flush()
+        with self.conn:
+            for statement in INDEXES:
+                self.conn.execute( statement )
+        self.conn.execute( "ANALYZE" )
+        self.conn.close()
@@ -5,6 +5,22 @@ from ..common import vName
 class vAttributeType( type ):
     attribute_class_registry = {}
 
+    def __new__(mcs, name, bases, nmspc):
+        # Attributes have no __dict__: unless the class defines __slots__ itself,
+        # slots are added for the class attributes it declares to decode into.
+        if '__slots__' not in nmspc:
+            names = list( nmspc.get( '_decoded_attr_names', () ) )
+            if '_value_class_attr_name' in nmspc:
+                names.append( nmspc[ '_value_class_attr_name' ] )
+            names.extend( nmspc.get( '_component_order', () ) )
+
+            inherited = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update( getattr( klass, '__slots__', () ) )
+            nmspc[ '__slots__' ] = tuple( dict.fromkeys( n for n in names if n not in inherited ) )
+        return super().__new__(mcs, name, bases, nmspc)
+
     def __init__(cls, name, bases, nmspc):
         super().__init__(name, bases, nmspc)
 
@@ -28,7 +44,13 @@ class vAttributeType( type ):
 
 
 class vAttribute( object, metaclass=vAttributeType ):
+    __slots__ = ( '_decode_pending', '_value', '_name', '_group', '_params' )
+    # names of the class attributes filled by decode_value(). They are decoded
+    # lazily from the raw value, the first time one of them is read.
+    _decoded_attr_names = ()
+
     def __init__(self):
+        self._decode_pending = False
         self._value = vValue( "" )
         self._name = vName( "" )
         self._group = vName( "" )
@@ -46,7 +68,34 @@ class vAttribute( object, metaclass=vAttributeType ):
 
     @value.setter
     def value(self, value):
-        self.decode_value( value )
+        # only store the raw value, decode_value() is called on demand
+        for name in self._decoded_attr_names:
+            try:
+                delattr( self, name )
+            except AttributeError:
+                pass
+        self._set_raw_value( value )
+        self._decode_pending = True
+
+    def __getattr__(self, name):
+        # only called if name was not found the normal way
+        if name in self._decoded_attr_names and self._decode_pending:
+            self._decode_raw_value()
+            return getattr( self, name )
+        raise AttributeError( "'{}' object has no attribute '{}'".format( type(self).__name__, name ) )
+
+    def _decode_raw_value(self):
+        self._decode_pending = False
+        # decoded attributes set after the raw value take precedence
+        set_attrs = {}
+        for name in self._decoded_attr_names:
+            try:
+                set_attrs[ name ] = object.__getattribute__( self, name )
+            except AttributeError:
+                pass
+        self.decode_value( self._value )
+        for name, value in set_attrs.items():
+            setattr( self, name, value )
 
     @property
     def name(self):
@@ -76,23 +125,33 @@ class vAttribute( object, metaclass=vAttributeType ):
         return self.serialize( original_value=False )
     
     def serialize(self, original_value=False):
+        return ''.join( self.iter_serialize( original_value=original_value ) )
+
+    def iter_serialize(self, original_value=False):
+        # yields the unfolded content line in pieces
         params = self._params.serialize()
         if params != '':
             params = ';' + params
 
+        yield "{}{}:".format( str(self.full_name), params )
+        yield from self._iter_serialize_value( original_value )
+
+    def _iter_serialize_value(self, original_value):
         if original_value:
-            value = self.original_value
+            yield str( self.original_value )
         else:
-            value = self.value
-
-        return "{}{}:{}".format( str(self.full_name), params, str(value) )
+            yield str( self.value )
     
     def encode_value(self):
         # use class attributes to create a value usabe as self._value
         # should not have side effects
         return vValue( self._value )
 
+    def _set_raw_value(self, value):
+        # store the raw value as self._value, called by the value setter
+        # cheap side effects like setting correct params belong here
+        self._value = vValue( value )
+
     def decode_value(self, value):
         # parse/decode value and fill class attributes and self._value
-        # can also have other side effects like setting correct params
         self._value = vValue( value )
@@ -8,6 +8,11 @@ class vAbstractTextAttr( vAttribute ):
 
     # class attribute storing the decoded value
     _value_class_attr_name = 'text'
+    _decoded_attr_names = ( 'text', )
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__( **kwargs )
+        cls._decoded_attr_names = ( cls._value_class_attr_name, )
     
     def __init__(self):
         text_value = vTextValue( "" )
@@ -18,6 +23,9 @@ class vAbstractTextAttr( vAttribute ):
         text_value = getattr(self, self._value_class_attr_name )
         return text_value.escape()
 
+    def _set_raw_value(self, value):
+        self._value = vTextValue( value )
+
     def decode_value(self, value):
         self._value = vTextValue( value )
         text_value = self._value.unescape()
@@ -28,6 +36,11 @@ class vAbstractTextListAttr( vAttribute ):
 
     # class attribute storing the decoded value list
     _value_class_attr_name = 'text'
+    _decoded_attr_names = ( 'text', )
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__( **kwargs )
+        cls._decoded_attr_names = ( cls._value_class_attr_name, )
     
     def __init__(self):
         self.__setattr__( self._value_class_attr_name, [] )
@@ -38,6 +51,9 @@ class vAbstractTextListAttr( vAttribute ):
         str_value_list = [ str(c.escape()) for c in text_value_list ]
         return vTextValue(',').join( str_value_list )
 
+    def _set_raw_value(self, value):
+        self._value = vTextValue( value )
+
     def decode_value(self, value):
         self._value = vTextValue( value )
         text_value_list = self._value.escaped_split( ',', unescape_parts=True )
@@ -50,6 +66,11 @@ class vAbstractStructTextAttr( vAttribute ):
     # list of class attribute names. The order corresponds to the semantic 
     # defined in the RFCs
     _component_order = ( )
+    _decoded_attr_names = ( )
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__( **kwargs )
+        cls._decoded_attr_names = tuple( cls._component_order )
 
     def __init__(self):
         for prop_name in self._component_order:
@@ -64,6 +85,9 @@ class vAbstractStructTextAttr( vAttribute ):
             struct_str_list.append( ','.join(str_value_list) )
         return vTextValue(';').join( struct_str_list )
 
+    def _set_raw_value(self, value):
+        self._value = vTextValue( value )
+
     def decode_value(self, value):
         self._value = vTextValue( value )
         struct = self._value.escaped_split( ';' )
@@ -77,16 +101,19 @@ class vAbstractStructTextAttr( vAttribute ):
 
 class vAbstractBinaryUriAttr( vAttribute ):
     # abstract class implementing a binary value type with inline or url content
+    __slots__ = ( '_uri', '_data', '_raw_is_uri' )
+    _decoded_attr_names = ( '_uri', '_data' )
     
     def __init__(self):
         super().__init__()
         self._uri = vValue( '' )
         self._data = vBinaryValue( b'' )
+        self._raw_is_uri = False
 
     @property
     def has_uri(self):
-        value_param = self._params.get( 'value', default=vParameter() )
-        return value_param.has_value( 'uri', ignorecase=True )
+        value_param = self._params.get( 'value' )
+        return value_param is not None and value_param.has_value( 'uri', ignorecase=True )
 
     @property
     def uri(self):
@@ -112,13 +139,24 @@ class vAbstractBinaryUriAttr( vAttribute ):
             return vValue( self._uri )
         return vBinaryValue( self._data )
 
+    def _iter_serialize_value(self, original_value):
+        if original_value or self.has_uri:
+            yield from super()._iter_serialize_value( original_value )
+            return
+        # large payloads are encoded in pieces
+        yield from self._data.iter_base64()
+
+    def _set_raw_value(self, value):
+        self._value = vValue( value )
+        # the params may change before the value is decoded
+        self._raw_is_uri = self.has_uri
+        if not self._raw_is_uri:
+            self._params.set( 'encoding', 'b' )
+
     def decode_value(self, value):
-        if self.has_uri:
-            self._value = vValue( value )
-            self._uri = self._value
+        if self._raw_is_uri:
+            self._uri = vValue( value )
             self._data = vBinaryValue( b'' )
         else:
-            self._value = vBinaryValue( value )
             self._uri = vValue( '' )
-            self._data = self._value
-            self._params.set( 'encoding', 'b' )
+            self._data = vBinaryValue.from_base64( str(value) )
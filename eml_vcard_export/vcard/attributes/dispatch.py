@@ -0,0 +1,41 @@
+class AttributeDispatcher( object ):
+    # maps attribute classes to handlers, used by the export strategies in place
+    # of isinstance chains. The handler of a concrete class is the one registered
+    # for the nearest class in its MRO, resolved on first use and cached.
+    # Handlers should be picklable (bound methods, functools.partial), the
+    # strategies are sent to the worker processes.
+
+    def __init__(self, default=None):
+        # default: handler of classes without a registered base, e.g. unknown X- attributes
+        self.default = default
+        self.handlers = {}
+        self._resolved = {}
+
+    def register(self, attr_class, handler):
+        self.handlers[ attr_class ] = handler
+        self._resolved.clear()
+
+    def register_all(self, handler_list):
+        # handler_list: iterable of (attribute class, handler)
+        for attr_class, handler in handler_list:
+            self.register( attr_class, handler )
+
+    def resolve(self, attr_class):
+        try:
+            return self._resolved[ attr_class ]
+        except KeyError:
+            pass
+
+        handler = self.default
+        for klass in attr_class.__mro__:
+            if klass in self.handlers:
+                handler = self.handlers[ klass ]
+                break
+        self._resolved[ attr_class ] = handler
+        return handler
+
+    def __call__(self, attr, *args):
+        handler = self.resolve( type(attr) )
+        if handler is None:
+            return None
+        return handler( attr, *args )
@@ -81,6 +81,7 @@ class vAgentAttribute( vAbstractTextAttr ):
 class vOrgAttribute( vAttribute ):
     # RFC2426 section 3.5.5
     registered_names = ( 'org', )
+    _decoded_attr_names = ( 'organization', 'divisions' )
 
     def __init__(self):
         self.organization = self.new_value( "" )
@@ -96,6 +97,9 @@ class vOrgAttribute( vAttribute ):
         struct_str_list = [ str(c.escape()) for c in text_value_list ]
         return vTextValue(';').join( struct_str_list )
 
+    def _set_raw_value(self, value):
+        self._value = vTextValue( value )
+
     def decode_value(self, value):
         self._value = vTextValue( value )
         text_value_list = self._value.escaped_split( ';', unescape_parts=True )
@@ -1,3 +1,5 @@
+import sys
+
 from .lexer import vcard_fold_line
 
 class vCardError( Exception ):
@@ -5,20 +7,43 @@ class vCardError( Exception ):
 
 
 class vName( object ):
+    # names compare case insensitive, key is the casefolded value
+    # names are a small vocabulary repeated in every card, both strings are interned
+    __slots__ = ( '_value', 'key' )
+
     def __init__(self, value):
-        self.value = str(value)
+        self.value = value
+
+    @property
+    def value(self):
+        return self._value
+    @value.setter
+    def value(self, value):
+        self._value = sys.intern( str(value) )
+        self.key = sys.intern( self._value.casefold() )
+
+    @staticmethod
+    def key_of( name ):
+        if isinstance( name, vName ):
+            return name.key
+        return str(name).casefold()
     
     def __str__(self):
-        return self.value
+        return self._value
 
     def __eq__(self, other):
-        return str(self).casefold() == str(other).casefold()
+        return self.key == vName.key_of( other )
+
+    def __hash__(self):
+        # equal to the hash of the casefolded str
+        return hash( self.key )
 
     def __add__(self, other):
         return vName( str(self)+str(other) )
 
 
 class vCard( object ):
+    __slots__ = ( 'attrs', )
 
     def __init__(self):
         # storing attributes in a list to preserve original order
@@ -33,9 +58,9 @@ class vCard( object ):
     def __str__(self):
         return self.serialize()
     
-    def serialize(self, original_values=False, line_length=75):
+    def serialize(self, original_values=False, line_length=75, octets=False):
         lines = []
         for attr in self.attrs:
             line = attr.serialize( original_value=original_values ) 
-            line = vcard_fold_line( line, line_length=line_length )
+            lines.append( vcard_fold_line( line, line_length=line_length, octets=octets ) )
         return '\n'.join( lines )
@@ -1,21 +1,124 @@
 import re
 
-def vcard_fold_line( logical_line, line_length=75 ):
-    # RFC2425 section 5.8.1 
-    out = ""
-    log_line_len = len( logical_line )
+def _fold_chunks_chars( logical_line, line_length ):
+    # first physical line has line_length chars, continuation lines one less
+    # to leave room for the leading space
+    chunks = [ logical_line[ :line_length ] ]
+    chunks.extend( logical_line[ i:i+line_length-1 ] for i in range( line_length, len(logical_line), line_length-1 ) )
+    return chunks
 
-    for i in range( log_line_len ):
-        out += logical_line[ i ]
+def _utf8_char_end( data, start ):
+    end = start + 1
+    while end < len(data) and (data[ end ] & 0xC0) == 0x80:
+        end += 1
+    return end
 
-        if i % line_length == 0 and i != 0 and i < log_line_len-1:
-            # only fold if there is still content
-            out += "\n "
-    
-    return out
+def _fold_chunks_octets( logical_line, line_length ):
+    data = logical_line.encode( "utf-8" )
+    data_len = len( data )
+    chunks = []
+    start = 0
+    limit = line_length
+    while start < data_len:
+        end = start + limit
+        if end < data_len:
+            # never split a multi-octet UTF-8 sequence: back off continuation octets
+            while end > start and (data[ end ] & 0xC0) == 0x80:
+                end -= 1
+            if end == start:
+                # a single character longer than the limit
+                end = _utf8_char_end( data, start )
+        chunks.append( data[ start:end ].decode( "utf-8" ) )
+        start = end
+        limit = line_length - 1
+    return chunks
+
+def vcard_fold_line( logical_line, line_length=75, octets=False, out=None ):
+    # RFC2425 section 5.8.1: physical lines SHOULD NOT be longer than line_length
+    # (excluding the line break), a continuation line starts with a single space.
+    # octets: count UTF-8 octets instead of characters, as the RFC requires
+    # out: file like object the folded line is written to, instead of returning it
+    if line_length < 2:
+        raise ValueError( "line_length must be at least 2" )
+
+    if len( logical_line ) <= line_length and (not octets or logical_line.isascii()):
+        chunks = [ logical_line ]
+    elif octets and not logical_line.isascii():
+        chunks = _fold_chunks_octets( logical_line, line_length )
+    else:
+        chunks = _fold_chunks_chars( logical_line, line_length )
+
+    if out is None:
+        return "\n ".join( chunks )
+
+    out.write( chunks[0] )
+    for chunk in chunks[1:]:
+        out.write( "\n " )
+        out.write( chunk )
+
+class vCardFoldingWriter( object ):
+    # writes a logical line given in pieces to out, folding like vcard_fold_line
+    # the pieces are folded as they arrive, the logical line is never built
+
+    def __init__(self, out, line_length=75, octets=False):
+        if line_length < 2:
+            raise ValueError( "line_length must be at least 2" )
+        self.out = out
+        self.line_length = line_length
+        self.octets = octets
+        # length of the current physical line, in chars or octets
+        self.column = 0
+
+    def _fold(self):
+        self.out.write( "\n " )
+        self.column = 1
+
+    def write(self, text):
+        if self.octets and not text.isascii():
+            self._write_octets( text.encode( "utf-8" ) )
+            return
+
+        pos = 0
+        text_len = len( text )
+        while pos < text_len:
+            if self.column >= self.line_length:
+                self._fold()
+            end = pos + self.line_length - self.column
+            chunk = text[ pos:end ]
+            self.out.write( chunk )
+            self.column += len( chunk )
+            pos = end
+
+    def _write_octets(self, data):
+        pos = 0
+        data_len = len( data )
+        while pos < data_len:
+            if self.column >= self.line_length:
+                self._fold()
+            end = min( pos + self.line_length - self.column, data_len )
+            if end < data_len:
+                # never split a multi-octet UTF-8 sequence
+                while end > pos and (data[ end ] & 0xC0) == 0x80:
+                    end -= 1
+                if end == pos:
+                    if self.column > 1:
+                        self._fold()
+                        continue
+                    # a single character longer than the line
+                    end = _utf8_char_end( data, pos )
+            self.out.write( data[ pos:end ].decode( "utf-8" ) )
+            self.column += end - pos
+            pos = end
+
+# logical line: a physical line followed by any number of continuation lines,
+# which start with a single space or tab (RFC2425 section 5.8.1). Accepting
+# \r\n, \r, \n as line end (RFC accepts only \r\n), empty lines are ignored.
+_LOGICAL_LINE_RE = re.compile( '[^\r\n]*(?:[\r\n]+[ \t][^\r\n]*)*' )
+_LINE_SEP_RE = re.compile( '[\r\n]+' )
+_LINE_BREAK_RE = re.compile( '\r\n|\r|\n' )
+_FOLD_RE = re.compile( '[\r\n]+[ \t]' )
 
 class vCardLineTokenizer( object ):
-    # TODO: track line range: current logical line L, which is from line l to line k
     def __init__(self, data=''):
         self.load( data )
     
@@ -23,41 +126,43 @@ class vCardLineTokenizer( object ):
         self.index = 0
         self.max_index = len(data)
         self.data = data
+        # physical line range (1-based, inclusive) of the current logical line
         self.line_number = 0
+        self.line_range = ( 0, 0 )
         self.line = ""
+        self._next_line_number = 1
+        self._skip_line_sep()
+
+    def _skip_line_sep(self):
+        m = _LINE_SEP_RE.match( self.data, self.index )
+        if m is not None:
+            self._next_line_number += self._count_line_breaks( m.group(0) )
+            self.index = m.end()
+
+    @staticmethod
+    def _count_line_breaks( text ):
+        return len( _LINE_BREAK_RE.findall( text ) )
     
     def next(self):
-        state = ''
-        idx = self.index
-        line_buff = ''
-        while True:
-            if idx == self.max_index:
-                break
-            c = self.data[ idx ]
-            
-            # state machine transition
-            if c in ('\r', '\n'):
-                # accepting \r\n, \r, \n as line end (RFC accepts only \r\n)
-                state = 'CR_LF'
-            elif state == 'CR_LF':
-                if c in ('\t', ' '):
-                    state = 'CR_LF_SP'
-                else:
-                    state = 'CR_LF_NSP'
-            else:
-                state = ''
-            
-            if state == 'CR_LF_NSP':
-                # normal line without folding or end of folded line
-                break
-            elif c != '\r' and c != '\n' and state != 'CR_LF_SP':
-                # filter CR, LF and CR_LF_SP
-                line_buff += c
-
-            idx += 1
-        
-        self.index = idx
-        self.line = line_buff
+        if self.index >= self.max_index:
+            self.line = ''
+            return self.line
+
+        m = _LOGICAL_LINE_RE.match( self.data, self.index )
+        line = m.group(0)
+        first_line = self._next_line_number
+        last_line = first_line
+        if '\r' in line or '\n' in line:
+            last_line += self._count_line_breaks( line )
+            line = _FOLD_RE.sub( '', line )
+
+        self.index = m.end()
+        self.line_number = first_line
+        self.line_range = ( first_line, last_line )
+        self._next_line_number = last_line
+        self._skip_line_sep()
+
+        self.line = line
         return self.line
     
     def __iter__(self):
@@ -68,33 +173,58 @@ class vCardLineTokenizer( object ):
             raise StopIteration()
         return line
 
+class ParserError( Exception ):
+
+    def __init__(self, message, line_range=None):
+        if line_range is not None:
+            message = "line {}-{}: {}".format( line_range[0], line_range[1], message )
+        super().__init__( message )
+        # physical line range of the offending logical line, if known
+        self.line_range = line_range
+
+# https://tools.ietf.org/html/rfc2426#section-4
+#ABNF: contentline  = [group "."] name *(";" param) ":" value CRLF
+#ABNF: param        = param-name "=" param-value *("," param-value)
+#ABNF: param-value  = ptext / quoted-string
+_IDENTIFIER_PATTERN = '[A-Za-z0-9-]+'
+_PARAM_VALUE_PATTERN = '(?:"[^"]*"|[^";:,]+)'
+_PARAM_PATTERN = ';{id}={pv}(?:,{pv})*'.format( id=_IDENTIFIER_PATTERN, pv=_PARAM_VALUE_PATTERN )
+
+# matches a whole (unfolded) content line in one pass, lines not matching are
+# handed to the vCardTokenizer, which reports the error location
+CONTENT_LINE_RE = re.compile( '(?:(?P<group>{id})\\.)?(?P<name>{id})(?P<params>(?:{param})*):(?P<value>.*)'.format( 
+                              id=_IDENTIFIER_PATTERN, param=_PARAM_PATTERN ) )
+PARAM_RE = re.compile( ';(?P<name>{id})=(?P<values>{pv}(?:,{pv})*)'.format( id=_IDENTIFIER_PATTERN, pv=_PARAM_VALUE_PATTERN ) )
+PARAM_VALUE_RE = re.compile( _PARAM_VALUE_PATTERN )
+
 class vCardTokenizer( object ):
     # https://tools.ietf.org/html/rfc2426#section-4
+
+    terminal_re_map = {
+        #ABNF: group        = 1*(ALPHA / DIGIT / "-")
+        #ABNF: name         = x-name / iana-token
+        #ABNF: iana-token   = 1*(ALPHA / DIGIT / "-")
+        #ABNF: x-name       = "x-" 1*(ALPHA / DIGIT / "-")
+        #ABNF: param-name   = x-name / iana-token
+        'identifier': re.compile( '[a-zA-z0-9-]+' ),
+        #ABNF: quoted-string = DQUOTE QSAFE-CHAR DQUOTE
+        #ABNF: QSAFE-CHAR   = WSP / %x21 / %x23-7E / NON-ASCII ; Any character except CTLs, DQUOTE
+        'quoted-string': re.compile( '"[^"]*"' ),
+        #ABNF:   SAFE-CHAR    = WSP / %x21 / %x23-2B / %x2D-39 / %x3C-7E / NON-ASCII 
+        #                       ; Any character except CTLs, DQUOTE, ";", ":", ","
+        'safe-string': re.compile( '[^";:,]+' ),
+        # non-safe-chars:
+        'dot-char': re.compile( '\\.' ),
+        'colon-char': re.compile( ':' ),
+        'semicolon-char': re.compile( ';' ),
+        'comma-char': re.compile( ',' ),
+        'eq-char': re.compile( '=' ),
+        # may match empty string
+        'any-string': re.compile( '.*' ),
+    }
     
     def __init__(self, data=""):
         self.load( data )
-        self.terminal_re_map = {
-            #ABNF: group        = 1*(ALPHA / DIGIT / "-")
-            #ABNF: name         = x-name / iana-token
-            #ABNF: iana-token   = 1*(ALPHA / DIGIT / "-")
-            #ABNF: x-name       = "x-" 1*(ALPHA / DIGIT / "-")
-            #ABNF: param-name   = x-name / iana-token
-            'identifier': re.compile( '[a-zA-z0-9-]+' ),
-            #ABNF: quoted-string = DQUOTE QSAFE-CHAR DQUOTE
-            #ABNF: QSAFE-CHAR   = WSP / %x21 / %x23-7E / NON-ASCII ; Any character except CTLs, DQUOTE
-            'quoted-string': re.compile( '"[^"]*"' ),
-            #ABNF:   SAFE-CHAR    = WSP / %x21 / %x23-2B / %x2D-39 / %x3C-7E / NON-ASCII 
-            #                       ; Any character except CTLs, DQUOTE, ";", ":", ","
-            'safe-string': re.compile( '[^";:,]+' ),
-            # non-safe-chars:
-            'dot-char': re.compile( '\.' ),
-            'colon-char': re.compile( ':' ),
-            'semicolon-char': re.compile( ';' ),
-            'comma-char': re.compile( ',' ),
-            'eq-char': re.compile( '=' ),
-            # may match empty string
-            'any-string': re.compile( '.*' ),
-        }
     
     def load(self, data):
         self.data = data
@@ -114,7 +244,7 @@ class vCardTokenizer( object ):
 
             m = self.terminal_re_map[ terminal_name ].match( self.data, self.index )
             if m != None:
-                if m.start == m.end and not allow_empty:
+                if m.start() == m.end() and not allow_empty:
                     raise RuntimeError( "vcard tokenizer regex matched an empty string" )
                 # first matching regex wins
                 return self._set_current( m.end(0), m.group(0), peek=peek )
@@ -127,7 +257,7 @@ class vCardTokenizer( object ):
 
         if self.token == '':
             terms = []
-            curr = self.data[ self.index ]
+            curr = self.data[ self.index:self.index+1 ]
             for k,v in self.terminal_re_map.items():
                 if k in args:
                     terms.append( '{} ({})'.format(k,v.pattern) )
@@ -3,6 +3,8 @@ import re
 from .common import vCardError, vName
 
 class vParameterValue( object ):
+    __slots__ = ( 'value', 'force_quote' )
+
     def __init__(self, value, force_quote=None):
         if force_quote is None:
             # preserve quoting if string is quoted, even if not strictly needed
@@ -50,6 +52,8 @@ class vParameterValue( object ):
         
 
 class vParameter( object ):
+    __slots__ = ( 'values', '_name' )
+
     def __init__(self, name="", values=None ):
         if values is None:
             values = []
@@ -83,9 +87,21 @@ class vParameter( object ):
         return "{}={}".format( str(self.name), ",".join(va) )
 
 class vParameterList( object ):
-    
+    # params keeps the order, _positions maps the casefolded names to the index of
+    # their first occurrence in params. It is built on the first lookup, most lists
+    # are never searched. Renaming a vParameter after adding it is not supported.
+    __slots__ = ( 'params', '_positions' )
+
     def __init__(self):
         self.params = []
+        self._positions = None
+
+    def _get_positions(self):
+        if self._positions is None:
+            self._positions = {}
+            for i, param in enumerate( self.params ):
+                self._positions.setdefault( param.name.key, i )
+        return self._positions
     
     def _check_item_type(self, item):
         if not isinstance(item, vParameter ):
@@ -105,18 +121,16 @@ class vParameterList( object ):
         return ';'.join(pa)
 
     def index(self, name):
-        name = vName( name )
-        for i in range( len(self.params) ):
-            if self.params[ i ].name == name:
-                return i
-        raise ValueError()
+        try:
+            return self._get_positions()[ vName.key_of( name ) ]
+        except KeyError:
+            raise ValueError()
     
     def __getitem__(self, name):
-        name = vName( name )
-        for param in self.params:
-            if param.name == name:
-                return param
-        raise KeyError()
+        try:
+            return self.params[ self._get_positions()[ vName.key_of( name ) ] ]
+        except KeyError:
+            raise KeyError()
     
     def __setitem__(self, name, param):
         self._check_item_type( param )
@@ -125,20 +139,22 @@ class vParameterList( object ):
             index = self.index( param.name )
             self.params[ index ] = param 
         except ValueError:
-            self.params.append( param )
+            self.append( param )
     
     def __delitem__(self, name):
         try:
             index = self.index( name )
             del self.params[ index ]
         except ValueError:
-            pass
+            return
+        # the following positions shift, removing parameters is rare
+        self._positions = None
     
     def get(self, name, default=None):
-        try:
-            return self.__getitem__( name )
-        except KeyError:
+        index = self._get_positions().get( vName.key_of( name ) )
+        if index is None:
             return default
+        return self.params[ index ]
     
     def set(self, name, value_str):
         param = vParameter( name=name, values=[value_str] )
@@ -146,4 +162,6 @@ class vParameterList( object ):
     
     def append(self, param):
         self._check_item_type( param )
+        if self._positions is not None:
+            self._positions.setdefault( param.name.key, len(self.params) )
         self.params.append( param )
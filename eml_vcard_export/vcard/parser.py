@@ -1,4 +1,5 @@
-from .lexer import vCardLineTokenizer, vCardTokenizer
+from .lexer import vCardLineTokenizer, vCardTokenizer, ParserError
+from .lexer import CONTENT_LINE_RE, PARAM_RE, PARAM_VALUE_RE
 
 from .common import vCard
 from .attributes import vAttributeType, vAttribute
@@ -6,10 +7,6 @@ from .parameter import vParameter
 
 from . import attributes
 
-class ParserError( Exception ):
-    # TODO: line infos
-    pass
-
 def parse_vcard( vcard_data ):
     p = vCardParser()
     return p.parse_vcard( vcard_data )
@@ -21,9 +18,40 @@ class vCardParser( object ):
         self.line_tokenizer = None
         self.tokenizer = None
         
+    def _new_attr(self, group, name):
+        attr_cls = vAttributeType.class_for_name( name )
+        if attr_cls is None:
+            attr_cls = vAttribute
+        attr = attr_cls()
+
+        attr.name = name
+        attr.group = group
+        return attr
+
     def _parse_line(self, line):
+        # fast path: the whole content line is matched by a single regex
+        m = CONTENT_LINE_RE.match( line )
+        if m is None:
+            # slow path, raises a ParserError describing the problem
+            return self._parse_line_tokenized( line )
+
+        attr = self._new_attr( m.group( 'group' ) or '', m.group( 'name' ) )
+        params = m.group( 'params' )
+        if params:
+            for pm in PARAM_RE.finditer( params ):
+                param = vParameter()
+                param.name = pm.group( 'name' )
+                for value in PARAM_VALUE_RE.findall( pm.group( 'values' ) ):
+                    param.append_value( value )
+                attr.params.append( param )
+
+        # note decoding/parsing the value is done in the setter
+        # also set the value __after__ the params, since they contain decoding infos
+        attr.value = m.group( 'value' )
+        return attr
+
+    def _parse_line_tokenized(self, line):
         self.tokenizer = vCardTokenizer( line )
-        #attr = vAttribute()
         #ABNF: contentline  = [group "."] name *(";" param) ":" value CRLF
         #ABNF: name         = iana-token / x-name
         #ABNF: group        = 1*(ALPHA / DIGIT / "-")
@@ -37,13 +65,7 @@ class vCardParser( object ):
             group = name
             name = self.tokenizer.require_next( 'identifier' )
         
-        attr_cls = vAttributeType.class_for_name( name )
-        if attr_cls is None:
-            attr_cls = vAttribute
-        attr = attr_cls()
-
-        attr.name = name
-        attr.group = group
+        attr = self._new_attr( group, name )
 
         while self.tokenizer.has_next( 'semicolon-char' ):
             self.tokenizer.next( 'semicolon-char' )
@@ -51,8 +73,6 @@ class vCardParser( object ):
             attr.params.append( param )
 
         self.tokenizer.require_next( 'colon-char' )
-        # note decoding/parsing the value is done in the setter
-        # also set the value __after__ the params, since they contain decoding infos
         attr.value = self.tokenizer.next( 'any-string', allow_empty=True )
         return attr
     
@@ -78,6 +98,10 @@ class vCardParser( object ):
         self.line_tokenizer = vCardLineTokenizer( data )
         card = vCard()
         for line in self.line_tokenizer:
-            attr = self._parse_line( line )
+            self.current_line = self.line_tokenizer.line_number
+            try:
+                attr = self._parse_line( line )
+            except ParserError as e:
+                raise ParserError( str(e), line_range=self.line_tokenizer.line_range ) from e
             card.append_attr( attr )
         return card
@@ -3,6 +3,7 @@ import base64
 class vValue( object ):
     # base class for value of concrete vAttribute 
     # and value implementation for unknwon attributes
+    __slots__ = ( 'value', )
 
     def __init__(self, value=""):
         self.value = str(value)
@@ -21,6 +22,7 @@ class vValue( object ):
 
 class vTextValue( vValue ):
     # the RFC's refer this value type as text-value and text-value-list
+    __slots__ = ()
     
     def __init__(self, value=""):
         super().__init__( value )
@@ -31,8 +33,8 @@ class vTextValue( vValue ):
     def escape(self):
         # Note the instruction order
         value = self.value.replace("\\", "\\\\")
-        value = value.replace(";", "\;")
-        value = value.replace(",", "\,")
+        value = value.replace(";", "\\;")
+        value = value.replace(",", "\\,")
         value = value.replace("\r\n", "\\n")
         value = value.replace("\n", "\\n")
         value = value.replace("\r", "\\n")
@@ -41,8 +43,8 @@ class vTextValue( vValue ):
     def unescape(self):
         # Note the instruction order
         value = self.value.replace("\\\\", "\\")
-        value = value.replace("\;", ";")
-        value = value.replace("\,", ",")
+        value = value.replace("\\;", ";")
+        value = value.replace("\\,", ",")
         value = value.replace("\\n", "\n")
         value = value.replace("\\N", "\n")
         return vTextValue( value )
@@ -75,23 +77,58 @@ class vTextValue( vValue ):
 
 class vBinaryValue( object ):
     # the RFC's refer this value type as "inline, encoded binary data"
+    __slots__ = ( '_data', '_loader' )
     
     def __init__(self, data=b''):
+        # callable returning the data, called on first access of data
+        self._loader = None
         if isinstance(data, vBinaryValue):
-            self.data = data.data
+            self._data = data._data
+            self._loader = data._loader
         else:
             if not hasattr( data, 'decode' ):
                 raise TypeError( "data must be binary" )
-            self.data = data
-    
+            self._data = data
+
+    @property
+    def data(self):
+        if self._loader is not None:
+            self._data = self._loader()
+            self._loader = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._loader = None
+
+    @classmethod
+    def from_loader(cls, loader):
+        value = cls()
+        value._loader = loader
+        return value
+
+    def __getstate__(self):
+        # loaders are usually not picklable
+        # (None, slot values) is the state format of objects without __dict__
+        return ( None, { '_data': self.data, '_loader': None } )
+
     @classmethod
     def from_base64(cls, value_str):
         value = cls()
-        cls.data = base64.b64decode( value_str.encode("utf-8") )
+        value.data = base64.b64decode( value_str.encode("utf-8") )
         return value
     
     def to_base64(self):
         return base64.b64encode(self.data).decode("utf-8")
+
+    def iter_base64(self, chunk_size=3*16384):
+        # yields the base64 encoding in pieces, without copying the data
+        # chunk_size is rounded to a multiple of 3, so no padding occurs inside
+        chunk_size = max( 3, chunk_size - chunk_size % 3 )
+        data = memoryview( self.data )
+        for i in range( 0, len(data), chunk_size ):
+            yield base64.b64encode( data[ i:i+chunk_size ] ).decode( "ascii" )
     
     def __str__(self):
         return self.to_base64()
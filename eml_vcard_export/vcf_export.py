@@ -1,22 +1,42 @@
 import base64
+import io
 
 from . import vcard
-from .vcard.lexer import vcard_fold_line
+from .vcard import vAttribute, vBinaryValue, vTextValue
+from .vcard.lexer import vCardFoldingWriter
 from .directory_message import ContentId
 
 from .vcard.attributes import *
+from .vcard.attributes.dispatch import AttributeDispatcher
 
 class VcfExportStrategy( object ):
     def __init__(self):
-        pass
+        # optional BlobStore, binary payloads are replaced by a reference into it
+        self.blob_store = None
 
 class DefaultVcfExportStrategy( VcfExportStrategy ):
     
-    def __init__(self, line_length=75):
+    def __init__(self, line_length=75, fold_octets=False):
+        super().__init__()
         self.line_length = line_length
+        self.fold_octets = fold_octets
 
-    def message_to_vcard(self, dir_message ):
-        vcard_data = dir_message.extract_vcard()
+        # handlers are called with (attr, dir_message)
+        self.attr_loaders = AttributeDispatcher()
+        self.attr_loaders.register_all( [
+            ( vImageAttribute, self.load_binuri_attr ),
+            ( vSoundAttribute, self.load_binuri_attr ),
+        ] )
+        # handlers are called with (attr), return the pieces of the content line
+        self.attr_serializers = AttributeDispatcher( default=self.iter_serialize_original )
+        self.attr_serializers.register_all( [
+            ( vImageAttribute, self.iter_serialize_binuri_attr ),
+            ( vSoundAttribute, self.iter_serialize_binuri_attr ),
+        ] )
+
+    def message_to_vcard(self, dir_message, vcard_data=None ):
+        if vcard_data is None:
+            vcard_data = dir_message.extract_vcard()
 
         p = vcard.parser.vCardParser()
         card = p.parse_vcard( vcard_data )
@@ -27,10 +47,10 @@ class DefaultVcfExportStrategy( VcfExportStrategy ):
         return card
     
     def load_visit_attr(self, dir_message, attr):
-        if isinstance( attr, vImageAttribute ):
-            self.load_attr_content_uri( dir_message, attr )
-        elif isinstance( attr, vSoundAttribute ):
-            self.load_attr_content_uri( dir_message, attr )
+        self.attr_loaders( attr, dir_message )
+
+    def load_binuri_attr(self, attr, dir_message):
+        self.load_attr_content_uri( dir_message, attr )
     
     def load_attr_content_uri(self, dir_message, attr):
         if not attr.has_uri:
@@ -41,30 +61,61 @@ class DefaultVcfExportStrategy( VcfExportStrategy ):
         except ValueError:
             return
         
-        message = dir_message.find_part_by_cid( cid )
-        if message is None:
+        part = dir_message.find_part_by_cid( cid )
+        if part is None:
             return 
 
-        data = message.get_content()
-        if not isinstance(data, bytes):
+        # get_content() returns bytes for all other types
+        if part.get_content_maintype() in ( 'text', 'multipart', 'message' ):
             return
-        # setter also sets attr to binary mode
-        attr.data = data
+        # setter also sets attr to binary mode, the payload is decoded when the
+        # data is serialized
+        attr.data = vBinaryValue.from_loader( part.get_content )
+
 
+    def add_source_attr(self, card, source):
+        # X-EML-SOURCE before END:VCARD, source is a dict of sources.source_fields(),
+        # the values are the text components, e.g. archive;member or mbox;offset
+        attr = vAttribute()
+        attr.name = 'X-EML-SOURCE'
+        attr.value = vTextValue( ';' ).join( vTextValue( str(v) ).escape() for v in source.values() )
+        index = len( card.attrs )
+        if index != 0 and card.attrs[ -1 ].name.key == 'end':
+            index -= 1
+        card.attrs.insert( index, attr )
 
     def serialize_vcard(self, card):
-        lines= []
-        for attr in card.attrs:
-            line = self.serialize_attr( attr )
-            line = vcard_fold_line( line, line_length=self.line_length )
-            lines.append( line )
-        return '\n'.join( lines )
+        out = io.StringIO()
+        self.write_vcard( card, out )
+        return out.getvalue()
+
+    def write_vcard(self, card, out_fh):
+        # writes the folded lines of card to out_fh, without a trailing line break
+        for i, attr in enumerate( card.attrs ):
+            if i != 0:
+                out_fh.write( '\n' )
+            # binary values are encoded, folded and written in pieces
+            writer = vCardFoldingWriter( out_fh, line_length=self.line_length, octets=self.fold_octets )
+            for piece in self.iter_serialize_attr( attr ):
+                writer.write( piece )
     
     def serialize_attr(self, attr):
-        if isinstance( attr, vImageAttribute ):
-            return attr.serialize( original_value=False ) 
-        elif isinstance( attr, vSoundAttribute ):
-            return attr.serialize( original_value=False ) 
+        return ''.join( self.iter_serialize_attr( attr ) )
+
+    def store_attr_blob(self, attr):
+        # replaces inline data by a URI into the blob store
+        if self.blob_store is None or attr.has_uri:
+            return
+        blob = self.blob_store.store( attr.data.data )
+        del attr.params[ 'encoding' ]
+        attr.uri = blob.uri
+
+    def iter_serialize_attr(self, attr):
+        return self.attr_serializers( attr )
+
+    def iter_serialize_original(self, attr):
+        return attr.iter_serialize( original_value=True )
 
-        else:
-            return attr.serialize( original_value=True ) 
+    def iter_serialize_binuri_attr(self, attr):
+        self.store_attr_blob( attr )
+        return attr.iter_serialize( original_value=False ) 
@@ -0,0 +1,275 @@
+import re
+
+from .vcard.lexer import vCardLineTokenizer, _FOLD_RE
+from .vcard.parser import vCardParser
+from .vcard.value import vTextValue
+
+# Card selection for --where, see WhereExpression
+#
+#   expr    := or_expr
+#   or_expr := and_expr ( "or" and_expr )*
+#   and_expr:= not_expr ( "and" not_expr )*
+#   not_expr:= "not" not_expr | "(" expr ")" | term
+#   term    := NAME [ "[" PARAM "]" ] [ OP VALUE ]
+#   OP      := "=" | "!=" | "~" (contains) | "^=" (starts with) | "$=" (ends with)
+#
+# EMAIL is true if the card has an EMAIL attribute, TEL[TYPE] if it has a TEL
+# with a TYPE parameter. EMAIL $= '@example.com' compares the values of the EMAIL
+# attributes, TEL[TYPE] = cell the values of their TYPE parameters; a term is
+# true if any attribute matches. Names, groups excluded, and values are compared
+# case insensitive. VALUE is quoted with ' or ", or a bare word.
+#
+# A card is evaluated in stages, each one only runs if the previous could not
+# decide: a substring search for the names and values of the terms in the raw
+# vcard text, then the terms on the content lines of the attributes they name.
+# Only the selected cards are fully parsed by the exporters.
+
+class WhereSyntaxError( ValueError ):
+    pass
+
+_TOKEN_RE = re.compile( r'''\s*(?:(?P<op>!=|\^=|\$=|[=~\[\]()])|'(?P<sq>(?:[^'\\]|\\.)*)'|"(?P<dq>(?:[^"\\]|\\.)*)"|(?P<word>[^\s=!~^$\[\]()'"]+))''' )
+_ESCAPE_RE = re.compile( r'\\(.)' )
+_IDENTIFIER_RE = re.compile( r'[A-Za-z0-9-]+$' )
+# the group and name of a content line
+_LINE_NAME_RE = re.compile( r'(?:[A-Za-z0-9-]+\.)?([A-Za-z0-9-]+)[;:]' )
+# values containing these are escaped or encoded in the raw text, no substring search
+_ESCAPED_CHARS_RE = re.compile( r'[\\,;"\r\n]' )
+
+KEYWORDS = ( 'and', 'or', 'not' )
+
+def _needle( value ):
+    # the casefolded substring value must have in the raw text, or None
+    if not value or _ESCAPED_CHARS_RE.search( value ) is not None:
+        return None
+    return value.casefold()
+
+class WhereTerm( object ):
+    # NAME [ "[" PARAM "]" ] [ OP VALUE ]
+
+    _compare = {
+        '=':  lambda v, x: v == x,
+        '!=': lambda v, x: v != x,
+        '~':  lambda v, x: x in v,
+        '^=': lambda v, x: v.startswith( x ),
+        '$=': lambda v, x: v.endswith( x ),
+    }
+
+    def __init__(self, name, param=None, op=None, value=None):
+        self.name = name.casefold()
+        self.param = param.casefold() if param is not None else None
+        self.op = op
+        self.value = value.casefold() if value is not None else None
+
+    def names(self):
+        return { self.name }
+
+    def prefilter(self, text):
+        # text: unfolded and casefolded vcard, False if the term can not be true
+        if self.name not in text:
+            return False
+        if self.param is not None and self.param not in text:
+            return False
+        if self.op is not None and self.op != '!=':
+            needle = _needle( self.value )
+            if needle is not None and needle not in text:
+                return False
+        return True
+
+    def _iter_values(self, attr):
+        if self.param is None:
+            yield vTextValue( str( attr.original_value ) ).unescape().value
+            return
+        for param in attr.params:
+            if param.name.key == self.param:
+                for value in param.values:
+                    yield str(value)
+
+    def match(self, attrs):
+        # attrs: name => list of the parsed attributes
+        for attr in attrs.get( self.name, () ):
+            if self.op is None:
+                if self.param is None or any( p.name.key == self.param for p in attr.params ):
+                    return True
+                continue
+            compare = self._compare[ self.op ]
+            for value in self._iter_values( attr ):
+                if compare( value.casefold(), self.value ):
+                    return True
+        return False
+
+class WhereNot( object ):
+    def __init__(self, operand):
+        self.operand = operand
+
+    def names(self):
+        return self.operand.names()
+
+    def prefilter(self, text):
+        # the operand being possibly true says nothing about its negation
+        return True
+
+    def match(self, attrs):
+        return not self.operand.match( attrs )
+
+class WhereAnd( object ):
+    def __init__(self, operands):
+        self.operands = operands
+
+    def names(self):
+        return set().union( *( o.names() for o in self.operands ) )
+
+    def prefilter(self, text):
+        return all( o.prefilter( text ) for o in self.operands )
+
+    def match(self, attrs):
+        return all( o.match( attrs ) for o in self.operands )
+
+class WhereOr( WhereAnd ):
+    def prefilter(self, text):
+        return any( o.prefilter( text ) for o in self.operands )
+
+    def match(self, attrs):
+        return any( o.match( attrs ) for o in self.operands )
+
+class WhereParser( object ):
+    # recursive descent parser of the grammar above
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = self._tokenize( expr )
+        self.index = 0
+
+    def _tokenize(self, expr):
+        # list of (kind, text), kind is op, word or value
+        tokens = []
+        pos = 0
+        expr = expr.rstrip()
+        while pos < len(expr):
+            m = _TOKEN_RE.match( expr, pos )
+            if m is None or m.end() == pos:
+                raise WhereSyntaxError( "unexpected character at {}: {}".format( pos, expr[pos:] ) )
+            if m.group( 'op' ) is not None:
+                tokens.append( ( 'op', m.group( 'op' ) ) )
+            elif m.group( 'word' ) is not None:
+                tokens.append( ( 'word', m.group( 'word' ) ) )
+            else:
+                quoted = m.group( 'sq' ) if m.group( 'sq' ) is not None else m.group( 'dq' )
+                tokens.append( ( 'value', _ESCAPE_RE.sub( r'\1', quoted ) ) )
+            pos = m.end()
+        return tokens
+
+    def _peek(self):
+        if self.index < len( self.tokens ):
+            return self.tokens[ self.index ]
+        return ( None, None )
+
+    def _next(self):
+        token = self._peek()
+        self.index += 1
+        return token
+
+    def _is_keyword(self, token, keyword):
+        return token[0] == 'word' and token[1].lower() == keyword
+
+    def _expect(self, text):
+        token = self._next()
+        if token != ( 'op', text ):
+            raise WhereSyntaxError( "expected '{}', got {}".format( text, token[1] or "end of expression" ) )
+
+    def parse(self):
+        if not self.tokens:
+            raise WhereSyntaxError( "empty expression" )
+        node = self._parse_or()
+        if self.index < len( self.tokens ):
+            raise WhereSyntaxError( "unexpected '{}'".format( self._peek()[1] ) )
+        return node
+
+    def _parse_or(self):
+        operands = [ self._parse_and() ]
+        while self._is_keyword( self._peek(), 'or' ):
+            self._next()
+            operands.append( self._parse_and() )
+        if len( operands ) == 1:
+            return operands[0]
+        return WhereOr( operands )
+
+    def _parse_and(self):
+        operands = [ self._parse_not() ]
+        while self._is_keyword( self._peek(), 'and' ):
+            self._next()
+            operands.append( self._parse_not() )
+        if len( operands ) == 1:
+            return operands[0]
+        return WhereAnd( operands )
+
+    def _parse_not(self):
+        token = self._peek()
+        if self._is_keyword( token, 'not' ):
+            self._next()
+            return WhereNot( self._parse_not() )
+        if token == ( 'op', '(' ):
+            self._next()
+            node = self._parse_or()
+            self._expect( ')' )
+            return node
+        return self._parse_term()
+
+    def _parse_identifier(self, what):
+        kind, text = self._next()
+        if kind != 'word' or text.lower() in KEYWORDS or _IDENTIFIER_RE.match( text ) is None:
+            raise WhereSyntaxError( "expected {}, got {}".format( what, text or "end of expression" ) )
+        return text
+
+    def _parse_term(self):
+        name = self._parse_identifier( "an attribute name" )
+        param = None
+        if self._peek() == ( 'op', '[' ):
+            self._next()
+            param = self._parse_identifier( "a parameter name" )
+            self._expect( ']' )
+
+        kind, op = self._peek()
+        if kind != 'op' or op not in WhereTerm._compare:
+            return WhereTerm( name, param )
+        self._next()
+        kind, value = self._next()
+        if kind not in ( 'word', 'value' ):
+            raise WhereSyntaxError( "expected a value after '{}', got {}".format( op, value or "end of expression" ) )
+        return WhereTerm( name, param, op, value )
+
+class WhereExpression( object ):
+    # compiled --where expression, picklable, evaluated in the workers
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.root = WhereParser( expr ).parse()
+        self.names = frozenset( self.root.names() )
+
+    def __str__(self):
+        return self.expr
+
+    def prefilter(self, vcard_data):
+        # stage 1: False if the card can not match
+        text = _FOLD_RE.sub( '', vcard_data ).casefold()
+        return self.root.prefilter( text )
+
+    def parse_attrs(self, vcard_data):
+        # stage 2: only the content lines of the attributes named in the expression
+        # are parsed, the values are decoded on access
+        attrs = {}
+        parser = vCardParser()
+        tokenizer = vCardLineTokenizer( vcard_data )
+        line = tokenizer.next()
+        while line != '':
+            m = _LINE_NAME_RE.match( line )
+            if m is not None:
+                name = m.group(1).casefold()
+                if name in self.names:
+                    attrs.setdefault( name, [] ).append( parser._parse_line( line ) )
+            line = tokenizer.next()
+        return attrs
+
+    def match_text(self, vcard_data):
+        if not self.prefilter( vcard_data ):
+            return False
+        return self.root.match( self.parse_attrs( vcard_data ) )